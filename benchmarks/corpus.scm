@@ -0,0 +1,62 @@
+;; Synthesis benchmark corpus, in qBarliman.batch's problem format.
+;;
+;; Taken from the default Barliman example and the synthesis tests in
+;; qBarliman/minikanren/rel-interp/test-interp.scm, with the gensyms in
+;; their examples replaced by concrete symbols as they would be typed into
+;; the test panes.
+
+(problem append-default
+  (definition (define ,A
+                (lambda ,B
+                  ,C)))
+  (test (append '() '5) 5)
+  (test (append '(a) '6) '(a . 6))
+  (test (append '(e f) '(g h)) '(e f g h)))
+
+(problem append-skeleton
+  (definition (define append
+                (lambda (l s)
+                  (if (null? ,A)
+                      ,B
+                      ,C))))
+  (test (append '() '()) '())
+  (test (append '(a) '(b)) '(a b))
+  (test (append '(c d) '(e f)) '(c d e f)))
+
+(problem member-if-test-hole
+  (definition (define member?
+                (lambda (x l)
+                  (if (null? l)
+                      #f
+                      (let ((a (car l))
+                            (d (cdr l)))
+                        (if ,B
+                            #t
+                            (member? x d)))))))
+  (test (member? 'a '()) #f)
+  (test (member? 'a '(a)) #t)
+  (test (member? 'a '(b)) #f)
+  (test (member? 'a '(b a c d)) #t)
+  (test (member? 'a '(a b)) #t)
+  (test (member? 'a '(b c d e)) #f))
+
+(problem stutter-replicate
+  (definition (define append
+                (lambda (l s)
+                  (if (null? l)
+                      s
+                      (cons (car l)
+                            (append (cdr l) s)))))
+              (define stutter_n
+                (lambda (n xs)
+                  (if (null? xs)
+                      '()
+                      (append (replicate n (car xs))
+                              (stutter_n n (cdr xs))))))
+              (define replicate
+                (lambda (n x)
+                  (match n
+                    [`Z ,A]
+                    [`(S ,n^) ,B]))))
+  (test (stutter_n '(S Z) '(1 0)) '(1 0))
+  (test (stutter_n '(S (S Z)) '(3)) '(3 3)))
@@ -0,0 +1,93 @@
+"""
+Import-time benchmark: how long a fresh interpreter takes to import each
+module, and to get the editor window up.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time -r 20 qBarliman.batch
+
+Each measurement runs in a new Python process, repeated --repeat times;
+the median is reported. "own" is the import time of qBarliman's modules
+alone, from -X importtime, so it leaves out PySide6 and the standard library.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+DEFAULT_MODULES = [
+    "qBarliman.constants",
+    "qBarliman.templates",
+    "qBarliman.utils.query_builder",
+    "qBarliman.batch",
+    "qBarliman.controllers.editor_window_controller",
+]
+
+# Time from the first qBarliman import to a constructed editor window
+STARTUP_SCRIPT = """
+import time
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+start = time.perf_counter()
+from qBarliman.controllers.editor_window_controller import EditorWindowController
+EditorWindowController()
+print(time.perf_counter() - start)
+"""
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    paths = [PROJECT_ROOT, env.get("PYTHONPATH")]
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, paths))
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=True
+    )
+
+
+def import_times(module: str) -> Tuple[float, float]:
+    """Total and qBarliman-only import time of module, in seconds."""
+    stderr = _run(["-X", "importtime", "-c", f"import {module}"]).stderr
+    total = own = 0
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        total += int(self_us)
+        if name.strip().startswith("qBarliman"):
+            own += int(self_us)
+    return total / 1e6, own / 1e6
+
+
+def startup_time() -> float:
+    return float(_run(["-c", STARTUP_SCRIPT]).stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    parser.add_argument(
+        "--no-startup", action="store_true", help="skip the editor window"
+    )
+    args = parser.parse_args(argv)
+
+    print(f"{'module':48} {'total':>9} {'own':>9}")
+    for module in args.modules:
+        samples = [import_times(module) for _ in range(args.repeat)]
+        total = statistics.median(t for t, _ in samples)
+        own = statistics.median(o for _, o in samples)
+        print(f"{module:48} {total * 1000:7.1f}ms {own * 1000:7.1f}ms")
+    if not args.no_startup:
+        startup = statistics.median(startup_time() for _ in range(args.repeat))
+        print(f"{'editor window startup':48} {startup * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
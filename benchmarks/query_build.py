@@ -0,0 +1,142 @@
+"""
+Micro-benchmark: building queries by unrolling templates on every call
+against rendering templates unrolled once ahead of time.
+
+    python -m benchmarks.query_build
+    python -m benchmarks.query_build -n 2000 problems.scm
+
+No Scheme process is started; only query text is built.
+"""
+
+import argparse
+import contextlib
+import os
+import timeit
+
+from qBarliman.batch import load_problems
+from qBarliman.templates import (
+    ALL_TEST_STREAM_T,
+    ALL_TEST_WRITE_T,
+    EVAL_STRING_FAST_T,
+    MAKE_QUERY_SIMPLE_T,
+    MAKE_QUERY_TEST_T,
+    MAKE_QUERY_STRING_T,
+    PARSE_ANS_STRING_T,
+    unroll,
+)
+from qBarliman.utils import log as l
+from qBarliman.utils.load_interpreter import load_interpreter_code
+from qBarliman.utils.query_builder import QueryBuilder, SchemeQueryType
+
+from benchmarks.synthesis import DEFAULT_CORPUS
+
+
+def unrolled_queries(data, interpreter_code: str):
+    """Every query for one problem, built the old way: unroll on each call."""
+    all_tests = {
+        "load_mk_vicare": "",
+        "load_mk": "",
+        "interp_scm": interpreter_code,
+        "query_simple": MAKE_QUERY_STRING_T.template,
+        "defns": data.definition_text,
+        "body": ",_",
+        "expectedOut": "q",
+        "eval_string_fast": PARSE_ANS_STRING_T.template,
+        "all_tests_query": ALL_TEST_WRITE_T.template,
+        "all_test_inputs": " ".join(data.test_inputs),
+        "all_test_outputs": " ".join(data.test_expected),
+        "definitionText": data.definition_text,
+    }
+    simple = {
+        "name": "-simple",
+        "defns": data.definition_text,
+        "body": ",_",
+        "expectedOut": "q",
+        "eval_string_fast": PARSE_ANS_STRING_T.template,
+    }
+    test = {
+        "n": 1,
+        "defns": data.definition_text,
+        "body": data.test_inputs[0],
+        "expectedOut": data.test_expected[0],
+        "eval_string_fast": EVAL_STRING_FAST_T.template,
+    }
+    return [
+        unroll(MAKE_QUERY_SIMPLE_T, simple),
+        unroll(MAKE_QUERY_TEST_T, test),
+        unroll(ALL_TEST_WRITE_T, all_tests),
+        unroll(ALL_TEST_STREAM_T, {**all_tests, "n": 3}),
+    ]
+
+
+def rendered_queries(data, query_builder: QueryBuilder):
+    """The same queries from the precompiled templates.
+
+    The strategies' templates are rendered directly, leaving out the query
+    logging that build_query also does.
+    """
+    strategy = query_builder._strategy
+    all_tests = {
+        "definitionText": data.definition_text,
+        "all_test_inputs": " ".join(data.test_inputs),
+        "all_test_outputs": " ".join(data.test_expected),
+    }
+    return [
+        strategy(SchemeQueryType.SIMPLE).template.render(
+            {"defns": data.definition_text}
+        ),
+        strategy(SchemeQueryType.TEST).template.render(
+            {
+                "n": 1,
+                "defns": data.definition_text,
+                "body": data.test_inputs[0],
+                "expectedOut": data.test_expected[0],
+            }
+        ),
+        strategy(SchemeQueryType.ALL_TESTS).template.render(all_tests),
+        strategy(SchemeQueryType.ALL_TESTS_STREAM).template.render(
+            {"n": 3, **all_tests}
+        ),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.query_build")
+    parser.add_argument("corpus", nargs="*", default=[DEFAULT_CORPUS])
+    parser.add_argument("-n", "--number", type=int, default=500, help="rounds")
+    args = parser.parse_args(argv)
+    l.VERBOSE = -1
+
+    problems = [p for path in args.corpus for p in load_problems(path)]
+    documents = [p.document_data() for p in problems]
+    interpreter_code = load_interpreter_code()
+    query_builder = QueryBuilder(interpreter_code, prelude="")
+    # unroll prints any placeholders it leaves behind
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        for data in documents:
+            if unrolled_queries(data, interpreter_code) != rendered_queries(
+                data, query_builder
+            ):
+                raise SystemExit("Precompiled templates build different queries")
+
+    def old():
+        for data in documents:
+            unrolled_queries(data, interpreter_code)
+
+    def new():
+        for data in documents:
+            rendered_queries(data, query_builder)
+
+    queries = len(documents) * 4
+    with quiet:
+        old_s = min(timeit.repeat(old, number=args.number, repeat=3)) / args.number
+        new_s = min(timeit.repeat(new, number=args.number, repeat=3)) / args.number
+    print(f"{queries} queries per round, best of 3 x {args.number} rounds")
+    print(f"unroll per call:  {old_s / queries * 1e6:9.1f} us/query")
+    print(f"precompiled:      {new_s / queries * 1e6:9.1f} us/query")
+    print(f"speedup:          {old_s / new_s:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
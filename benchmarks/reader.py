@@ -0,0 +1,76 @@
+"""
+Micro-benchmark: checking a definitions buffer for syntax errors on every
+keystroke, by rereading all of it against the incremental reader.
+
+    python -m benchmarks.reader
+    python -m benchmarks.reader --kb 32 problems.scm
+
+The buffer is the corpus' definitions repeated to --kb kilobytes. Each
+keystroke types a character into a definition in the middle of the buffer.
+"""
+
+import argparse
+import statistics
+import time
+
+from qBarliman.batch import load_problems
+from qBarliman.utils import log as l
+from qBarliman.utils.incremental_reader import IncrementalReader
+from qBarliman.utils.sexp import SexpSyntaxError, read_all
+
+from benchmarks.synthesis import DEFAULT_CORPUS
+
+
+def keystrokes(text: str, count: int):
+    """Versions of text after each of count characters typed mid-buffer."""
+    pos = text.index("(define", len(text) // 2) + len("(define")
+    for _ in range(count):
+        text = f"{text[:pos]}x{text[pos:]}"
+        pos += 1
+        yield text
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.reader")
+    parser.add_argument("corpus", nargs="*", default=[DEFAULT_CORPUS])
+    parser.add_argument("--kb", type=int, default=8, help="buffer size")
+    parser.add_argument("-n", "--number", type=int, default=500, help="keystrokes")
+    args = parser.parse_args(argv)
+    l.VERBOSE = -1
+
+    problems = [p for path in args.corpus for p in load_problems(path)]
+    definitions = "\n\n".join(p.definition for p in problems)
+    text = definitions
+    while len(text) < args.kb * 1024:
+        text += "\n\n" + definitions
+    versions = list(keystrokes(text, args.number))
+
+    def full(version):
+        try:
+            read_all(version)
+        except SexpSyntaxError:
+            pass
+
+    reader = IncrementalReader()
+    reader.update(text)
+    results = {}
+    for name, check in (("full reread", full), ("incremental", reader.update)):
+        samples = []
+        for version in versions:
+            start = time.perf_counter()
+            check(version)
+            samples.append(time.perf_counter() - start)
+        results[name] = _percentiles(samples)
+
+    print(f"{len(text) / 1024:.1f} KB buffer, {args.number} keystrokes")
+    for name, (median, p95) in results.items():
+        print(f"{name:12} median {median * 1e6:9.1f} us   p95 {p95 * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
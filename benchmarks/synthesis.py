@@ -0,0 +1,200 @@
+"""
+Synthesis benchmarks: time-to-first-answer for each query kind.
+
+    python -m benchmarks.synthesis                      # compare with baseline
+    python -m benchmarks.synthesis --save-baseline      # record a new baseline
+    python -m benchmarks.synthesis -r 10 --threshold 0.1 problems.scm
+
+Every problem in the corpus is run as a simple query, one query per test
+and an allTests query, --repeat times each, with the result cache off. A
+run succeeds if its query printed an answer: a parse, a test's (_.0), or
+the synthesized definitions.
+Medians and percentiles are compared against the baseline file; the run
+fails if any median is more than --threshold slower, or if a query that
+used to succeed no longer does. Baselines are machine specific, so record
+one on the machine that runs the comparison.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Signal
+
+from qBarliman.batch import Problem, load_problems
+from qBarliman.models.task_result import TaskResult
+from qBarliman.operations.result_cache import ResultCache
+from qBarliman.operations.scheme_execution_service import (
+    SchemeExecutionService,
+    has_answer,
+)
+from qBarliman.utils import log as l
+from qBarliman.utils.interpreter_cache import interpreter_build
+from qBarliman.utils.query_builder import QueryBuilder, SchemeQueryType
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCHMARKS_DIR, "corpus.scm")
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+# (benchmark name, query type, query builder data)
+Job = Tuple[str, SchemeQueryType, object]
+
+
+def corpus_jobs(problems: List[Problem]) -> List[Job]:
+    jobs = []
+    for problem in problems:
+        data = problem.document_data()
+        jobs.append((f"{problem.name}/simple", SchemeQueryType.SIMPLE, data))
+        for n in range(1, len(problem.tests) + 1):
+            jobs.append((f"{problem.name}/test{n}", SchemeQueryType.TEST, (data, n)))
+        jobs.append((f"{problem.name}/allTests", SchemeQueryType.ALL_TESTS, data))
+    return jobs
+
+
+class BenchmarkRunner(QObject):
+    """Runs each job repeat times and collects its results."""
+
+    finished = Signal()
+
+    def __init__(self, jobs: List[Job], repeat: int, jobs_at_once: int):
+        super().__init__()
+        self.service = SchemeExecutionService(
+            max_workers=jobs_at_once, warm_workers=0, result_cache=ResultCache(0)
+        )
+        # Time every run against the compiled interpreter, not the sources
+        interpreter_build().wait()
+        self.query_builder = QueryBuilder()
+        self.results: Dict[str, List[TaskResult]] = defaultdict(list)
+        self._queue = [job for job in jobs for _ in range(repeat)]
+        self._in_flight: Dict[str, str] = {}  # task type -> benchmark name
+        self._jobs_at_once = jobs_at_once
+        self.service.taskResultReady.connect(self._handle_task_result)
+
+    def start(self):
+        for _ in range(min(self._jobs_at_once, len(self._queue))):
+            self._start_next()
+        if not self._in_flight:
+            self.finished.emit()
+
+    def _start_next(self):
+        if not self._queue:
+            return
+        name, query_type, data = self._queue.pop(0)
+        task_type = f"bench{len(self._queue)}"
+        self._in_flight[task_type] = name
+        query = self.query_builder.build_query(query_type, data)
+        self.service.execute_source(query, task_type)
+
+    def _handle_task_result(self, result: TaskResult):
+        if not (name := self._in_flight.pop(result.task_type, None)):
+            return
+        self.results[name].append(result)
+        l.info(f"{name}: {result.status.name} {result.elapsed_time or 0:.3f}s")
+        self._start_next()
+        if not self._in_flight:
+            self.finished.emit()
+
+
+def summarize(results: List[TaskResult]) -> dict:
+    times = sorted(r.elapsed_time or 0.0 for r in results)
+    # Percentile cut points need at least two samples
+    cuts = statistics.quantiles(times, n=20) if len(times) > 1 else times * 19
+    return {
+        "runs": len(times),
+        "succeeded": sum(map(has_answer, results)),
+        "min": times[0],
+        "median": statistics.median(times),
+        "p90": cuts[17],
+        "p95": cuts[18],
+        "max": times[-1],
+    }
+
+
+def compare(summary: dict, baseline: dict, threshold: float) -> List[str]:
+    """Regressions of summary against baseline, as messages."""
+    regressions = []
+    for name, stats in summary.items():
+        if not (base := baseline.get(name)):
+            continue
+        if base["succeeded"] == base["runs"] and stats["succeeded"] < stats["runs"]:
+            ok = f"{stats['succeeded']}/{stats['runs']}"
+            regressions.append(f"{name}: only {ok} succeeded")
+        if base["median"] > 0 and stats["median"] > base["median"] * (1 + threshold):
+            slowdown = stats["median"] / base["median"]
+            regressions.append(
+                f"{name}: median {stats['median']:.3f}s is {slowdown:.2f}x "
+                f"the baseline {base['median']:.3f}s"
+            )
+    return regressions
+
+
+def print_table(summary: dict, baseline: dict):
+    header = ("benchmark", "ok", "median", "p90", "p95", "base")
+    print("{:40} {:>5} {:>8} {:>8} {:>8} {:>8}".format(*header))
+    for name, s in summary.items():
+        base = baseline.get(name, {}).get("median")
+        base_text = f"{base:8.3f}" if base is not None else f"{'-':>8}"
+        ok = f"{s['succeeded']}/{s['runs']}"
+        print(
+            f"{name:40} {ok:>5} {s['median']:8.3f} {s['p90']:8.3f} "
+            f"{s['p95']:8.3f} {base_text}"
+        )
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.synthesis")
+    parser.add_argument("corpus", nargs="*", default=[DEFAULT_CORPUS])
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="queries at once")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed median slowdown"
+    )
+    parser.add_argument("-v", "--verbose", type=int, default=0, help="log level")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    l.VERBOSE = args.verbose
+    problems = [p for path in args.corpus for p in load_problems(path)]
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    runner = BenchmarkRunner(corpus_jobs(problems), args.repeat, args.jobs)
+    runner.finished.connect(app.quit)
+    QTimer.singleShot(0, runner.start)
+    # Keep logging off stdout, which carries the table
+    with contextlib.redirect_stdout(sys.stderr):
+        app.exec()
+
+    summary = {name: summarize(results) for name, results in runner.results.items()}
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        print_table(summary, {})
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+    print_table(summary, baseline)
+
+    if regressions := compare(summary, baseline, args.threshold):
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
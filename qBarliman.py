@@ -4,7 +4,9 @@ import sys
 
 from PySide6.QtWidgets import QApplication
 
+from qBarliman.constants import TRACE_FILE, scheme_executable
 from qBarliman.controllers.editor_window_controller import EditorWindowController
+from qBarliman.utils.tracing import tracer
 
 
 def signal_handler(signum, frame):
@@ -14,11 +16,16 @@ def signal_handler(signum, frame):
 
 
 def main():
+    if not scheme_executable():
+        sys.exit(1)
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     app = QApplication(sys.argv)
     EditorWindowController()
-    sys.exit(app.exec())
+    status = app.exec()
+    if TRACE_FILE:
+        tracer.export(TRACE_FILE)
+    sys.exit(status)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+"""
+Headless batch synthesis: run many Barliman problems without a display.
+
+    python -m qBarliman.batch problems/*.json problems/*.scm -o report.jsonl
+
+A problem is a definition template plus input/output tests. JSON files hold
+one problem object or a list of them:
+
+    {"name": "append",
+     "definition": "(define append (lambda (l s) ,A))",
+     "tests": [["(append '() '())", "'()"], ["(append '(a) '(b))", "'(a b)"]]}
+
+Expected outputs are expressions, like the inputs, so a list is quoted.
+S-expression files hold one or more problem forms:
+
+    (problem append
+      (definition (define append (lambda (l s) ,A)))
+      (test (append '() '()) '())
+      (test (append '(a) '(b)) '(a b)))
+
+Each problem's allTests query runs on the execution service's worker pool,
+and one JSON line per problem is written to the report as it finishes.
+Only QtCore is used, so no display is needed.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, TextIO
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Signal
+
+from qBarliman.constants import (
+    CORE_FULLPATH,
+    PROCESS_TIMEOUT_MS,
+    PROFILED_FULLPATH,
+    SEARCH_PROFILE,
+    TRACE_FILE,
+    scheme_executable,
+)
+from qBarliman.models.scheme_document_data import SchemeDocumentData
+from qBarliman.models.task_result import TaskResult, TaskStatus
+from qBarliman.operations.resource_limits import ResourceLimits
+from qBarliman.operations.scheme_execution_service import SchemeExecutionService
+from qBarliman.operations.search_profile import SearchProfile
+from qBarliman.utils import log as l
+from qBarliman.utils.interpreter_cache import interpreter_build
+from qBarliman.utils.query_builder import QueryBuilder, SchemeQueryType
+from qBarliman.utils.sexp import LIST, SexpSyntaxError, read_all
+from qBarliman.utils.tracing import tracer
+
+
+class ProblemFormatError(ValueError):
+    """Raised when a problem file cannot be understood."""
+
+
+@dataclass
+class Problem:
+    name: str
+    definition: str
+    tests: List[tuple] = field(default_factory=list)  # (input, expected) pairs
+    source: str = ""
+
+    def document_data(self) -> SchemeDocumentData:
+        return SchemeDocumentData(
+            self.definition,
+            [i for i, _ in self.tests],
+            [o for _, o in self.tests],
+        )
+
+
+def _json_problem(obj, source: str, default_name: str) -> Problem:
+    if not isinstance(obj, dict) or "definition" not in obj:
+        raise ProblemFormatError(f"{source}: problem needs a definition")
+    tests = []
+    for test in obj.get("tests", []):
+        if isinstance(test, dict):
+            test = (test.get("input", ""), test.get("expected", ""))
+        if len(test) != 2:
+            raise ProblemFormatError(f"{source}: test {test!r} is not a pair")
+        tests.append((str(test[0]), str(test[1])))
+    return Problem(obj.get("name", default_name), obj["definition"], tests, source)
+
+
+def _sexp_problem(text: str, datum, source: str) -> Problem:
+    head, *clauses = datum.children if datum.kind == LIST else (None,)
+    if head is None or head.text != "problem" or not clauses:
+        raise ProblemFormatError(f"{source}: expected (problem <name> clause ...)")
+    problem = Problem(text[clauses[0].start : clauses[0].end], "", [], source)
+    for clause in clauses[1:]:
+        is_clause = clause.kind == LIST and clause.children
+        keyword = clause.children[0].text if is_clause else ""
+        parts = [text[c.start : c.end] for c in clause.children[1:]]
+        if keyword == "definition":
+            problem.definition = "\n".join(parts)
+        elif keyword == "test" and len(parts) == 2:
+            problem.tests.append((parts[0], parts[1]))
+        else:
+            raise ProblemFormatError(
+                f"{source}: unexpected clause {text[clause.start : clause.end]}"
+            )
+    return problem
+
+
+def load_problems(path: str) -> List[Problem]:
+    """Read the problems in a .json or s-expression file."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ProblemFormatError(f"{path}: {e}") from e
+        items = data if isinstance(data, list) else [data]
+        return [
+            _json_problem(obj, path, stem if len(items) == 1 else f"{stem}-{i}")
+            for i, obj in enumerate(items, start=1)
+        ]
+    try:
+        return [_sexp_problem(text, datum, path) for datum in read_all(text)]
+    except SexpSyntaxError as e:
+        raise ProblemFormatError(f"{path}: {e}") from e
+
+
+class BatchRunner(QObject):
+    """Queues every problem's allTests query and reports results as they arrive."""
+
+    finished = Signal()
+
+    def __init__(
+        self,
+        problems: List[Problem],
+        execution_service: SchemeExecutionService,
+        report: TextIO,
+        query_builder: Optional[QueryBuilder] = None,
+    ):
+        super().__init__()
+        self.problems = problems
+        self.execution_service = execution_service
+        self.query_builder = query_builder or QueryBuilder()
+        self.report = report
+        self.statuses: Counter = Counter()
+        self._pending: Dict[str, Problem] = {}
+        self._start_time = 0.0
+        execution_service.taskResultReady.connect(self._handle_task_result)
+
+    def start(self):
+        self._start_time = time.monotonic()
+        warm = self.execution_service.uses_warm_workers
+        # Register every problem before queuing any, since cached results
+        # are reported synchronously
+        for index, problem in enumerate(self.problems, start=1):
+            self._pending[f"problem{index}"] = problem
+        for task_type, problem in list(self._pending.items()):
+            with tracer.span("launch", task_type, problem=problem.name):
+                self._launch(task_type, problem, warm)
+
+    def _launch(self, task_type: str, problem: Problem, warm: bool):
+        try:
+            # The streaming query prints its answer, or () if there is none
+            query = self.query_builder.build_query(
+                SchemeQueryType.ALL_TESTS_STREAM,
+                (problem.document_data(), 1),
+                with_prelude=not warm,
+            )
+        except Exception as e:
+            l.warn(f"Error building query for {problem.name}: {e}")
+            result = TaskResult(task_type, TaskStatus.FAILED, str(e))
+            self._handle_task_result(result)
+            return
+        if warm:
+            self.execution_service.execute_query(query, task_type)
+        else:
+            self.execution_service.execute_source(query, task_type)
+
+    def _handle_task_result(self, result: TaskResult):
+        if not (problem := self._pending.pop(result.task_type, None)):
+            return
+        self.statuses[result.status.name] += 1
+        record = {
+            "name": problem.name,
+            "source": problem.source,
+            "status": result.status.name,
+            "message": result.message,
+            "best_guess": result.output,
+            "elapsed": result.elapsed_time,
+            "finished_at": time.monotonic() - self._start_time,
+        }
+        if result.profile and (profile := SearchProfile.parse(result.profile)):
+            record["profile"] = profile.as_dict()
+            l.info("%s search profile:\n%s", problem.name, profile.summary())
+        self.report.write(json.dumps(record) + "\n")
+        self.report.flush()
+        l.good(f"{problem.name}: {result.message} ({len(self._pending)} left)")
+        if not self._pending:
+            self.finished.emit()
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m qBarliman.batch",
+        description="Run Barliman synthesis problems without the GUI.",
+    )
+    parser.add_argument(
+        "problems", nargs="+", help=".json or s-expression problem files"
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="JSONL report, - for stdout"
+    )
+    parser.add_argument("-j", "--jobs", type=int, help="concurrent Scheme processes")
+    parser.add_argument("--warm", type=int, default=0, help="use N warm workers")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=PROCESS_TIMEOUT_MS / 1000,
+        help="wall-clock seconds per problem",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="count interpreter clause work and add it to the report",
+    )
+    parser.add_argument(
+        "--trace", default=TRACE_FILE, help="write a Chrome trace-event JSON file"
+    )
+    parser.add_argument("-v", "--verbose", type=int, default=1, help="log level")
+    return parser.parse_args(argv)
+
+
+def run(args, stdout: TextIO) -> int:
+    if not scheme_executable():
+        return 2
+    problems = []
+    for path in args.problems:
+        try:
+            problems.extend(load_problems(path))
+        except (OSError, ProblemFormatError) as e:
+            l.warn(f"Skipping problem file: {e}")
+    if not problems:
+        l.warn("No problems to run")
+        return 2
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    signal.signal(signal.SIGINT, lambda signum, frame: app.quit())
+    # Python signal handlers only run when the interpreter gets control back
+    ticker = QTimer()
+    ticker.timeout.connect(lambda: None)
+    ticker.start(200)
+
+    limits = ResourceLimits(timeout_ms=int(args.timeout * 1000))
+    search_profile = args.profile or SEARCH_PROFILE
+    # Nothing to keep responsive, so every problem can wait for the compiled
+    # interpreter instead of loading the sources
+    interpreter_build(PROFILED_FULLPATH if search_profile else CORE_FULLPATH).wait()
+    service = SchemeExecutionService(
+        max_workers=args.jobs,
+        warm_workers=args.warm,
+        limits=limits,
+        search_profile=search_profile,
+    )
+    if args.output == "-":
+        report = stdout
+    else:
+        report = open(args.output, "w", encoding="utf-8")
+    try:
+        query_builder = QueryBuilder(search_profile=search_profile)
+        runner = BatchRunner(problems, service, report, query_builder)
+        runner.finished.connect(app.quit)
+        QTimer.singleShot(0, runner.start)
+        l.good(f"Running {len(problems)} problems")
+        app.exec()
+    finally:
+        service.cancel_all()
+        if report is not stdout:
+            report.close()
+        if args.trace:
+            tracer.export(args.trace)
+
+    l.good(", ".join(f"{n} {status}" for status, n in runner.statuses.items()))
+    done = sum(runner.statuses.values())
+    return 0 if done == len(problems) and runner.statuses.keys() <= {"SUCCESS"} else 1
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    l.VERBOSE = args.verbose
+    stdout = sys.stdout
+    # Logging prints to stdout, which is kept for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        sys.exit(run(args, stdout))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
+import functools
 import os
 import platform
 import shutil  # added import
-import sys
 import tempfile
 from typing import Optional
 
@@ -15,34 +15,42 @@ INTERP_EVAL_QS_FILE_1 = "interp-eval-query-string-part-1.scm"
 INTERP_EVAL_QS_FILE_2 = "interp-eval-query-string-part-2.scm"
 BARLIMAN_QUERY_SIMPLE_FILE = "barliman-query-simple.scm"
 BARLIMAN_QUERY_ALLTESTS_FILE = "barliman-query-alltests.scm"
+BARLIMAN_WORKER_FILE = "barliman-worker.scm"
+BARLIMAN_HELPERS_FILE = "barliman-helpers.scm"
+BARLIMAN_STDIN_FILE = "barliman-stdin.scm"
+BARLIMAN_SEARCH_PROFILE_FILE = "barliman-search-profile.scm"
 
 # Minikanren file names
 
 MK_VICARE_FILE = "mk-vicare.scm"
 MK_FILE = "mk.scm"
 MK_TEST_CHECK_FILE = "test-check.scm"
+INTERP_CLAUSE_FILE = "interp-clause.scm"
 INTERP_FILE = "interp.scm"
+INTERP_SIMPLE_FILE = "interp-simple.scm"
+INTERP_FANCY_FILE = "interp-fancy.scm"
 
 # File paths
 
 TMP_DIR = tempfile.gettempdir()
-TMP_DIR = os.path.join(TMP_DIR, "qBarliman")
-if not os.path.exists(TMP_DIR):
-    os.makedirs(TMP_DIR)
+TMP_DIR = os.path.join(TMP_DIR, "qBarliman")  # created by ensure_tmp_dir()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MINIKANREN_ROOT = os.path.join(BASE_DIR, "minikanren", "core")
 REL_INTERP_DIR = os.path.join(BASE_DIR, "minikanren", "rel-interp")
 TEMPLATES_DIR = os.path.join(BASE_DIR, "minikanren", "templates")
+RESULT_CACHE_DIR = os.path.join(TMP_DIR, "results")
 
 MK_VICARE_FULLPATH = os.path.join(MINIKANREN_ROOT, MK_VICARE_FILE)
 MK_FULLPATH = os.path.join(MINIKANREN_ROOT, MK_FILE)
 MK_TEST_CHECK_FULLPATH = os.path.join(MINIKANREN_ROOT, MK_TEST_CHECK_FILE)
+INTERP_CLAUSE_FULLPATH = os.path.join(REL_INTERP_DIR, INTERP_CLAUSE_FILE)
 INTERP_FULLPATH = os.path.join(REL_INTERP_DIR, INTERP_FILE)
 
 CORE_FULLPATH = [
     MK_VICARE_FULLPATH,
     MK_FULLPATH,
     MK_TEST_CHECK_FULLPATH,
+    INTERP_CLAUSE_FULLPATH,
     INTERP_FULLPATH,
 ]
 
@@ -51,11 +59,60 @@ INTERP_ALLTESTS_P_1 = os.path.join(TEMPLATES_DIR, ALLTESTS_QS_FILE_1)
 INTERP_ALLTESTS_P_2 = os.path.join(TEMPLATES_DIR, ALLTESTS_QS_FILE_2)
 INTERP_EVAL_P_1 = os.path.join(TEMPLATES_DIR, INTERP_EVAL_QS_FILE_1)
 INTERP_EVAL_P_2 = os.path.join(TEMPLATES_DIR, INTERP_EVAL_QS_FILE_2)
+BARLIMAN_WORKER_FULLPATH = os.path.join(TEMPLATES_DIR, BARLIMAN_WORKER_FILE)
+BARLIMAN_HELPERS_FULLPATH = os.path.join(TEMPLATES_DIR, BARLIMAN_HELPERS_FILE)
+BARLIMAN_STDIN_FULLPATH = os.path.join(TEMPLATES_DIR, BARLIMAN_STDIN_FILE)
+BARLIMAN_SEARCH_PROFILE_FULLPATH = os.path.join(
+    TEMPLATES_DIR, BARLIMAN_SEARCH_PROFILE_FILE
+)
+
+# The interpreter with its eval-expo clauses counted, for profiled queries only
+PROFILED_FULLPATH = [
+    *CORE_FULLPATH[:-1],
+    BARLIMAN_SEARCH_PROFILE_FULLPATH,
+    INTERP_FULLPATH,
+]
+
+# Interpreter variants the allTests portfolio can race, by name. Each list
+# ends with the interpreter, after the files shared with CORE_FULLPATH. The
+# variants without appendo get it from the helpers file. interp-dynamic is an
+# unimplemented stub and interp-hm loads its own miniKanren, so neither is here.
+INTERP_VARIANTS = {
+    "interp": CORE_FULLPATH,
+    "interp-simple": [
+        *CORE_FULLPATH[:-1],
+        BARLIMAN_HELPERS_FULLPATH,
+        os.path.join(REL_INTERP_DIR, INTERP_SIMPLE_FILE),
+    ],
+    "interp-fancy": [
+        *CORE_FULLPATH[:-1],
+        BARLIMAN_HELPERS_FULLPATH,
+        os.path.join(REL_INTERP_DIR, INTERP_FANCY_FILE),
+    ],
+}
+PORTFOLIO_STATS_PATH = os.path.join(TMP_DIR, "portfolio.json")
 
 # System paths and configuration
 
 TEST_TIMEOUT_MS = 5000  # 5 seconds for testing
-PROCESS_TIMEOUT_MS = 600000  # 60 seconds for processes
+PROCESS_TIMEOUT_MS = 600000  # 10 minutes of wall-clock time per Scheme task
+SCHEME_CPU_LIMIT_S = 600  # CPU seconds per Scheme process, 0 disables
+SCHEME_MEMORY_LIMIT_MB = 4096  # address space per Scheme process, 0 disables
+MAX_WORKERS = os.cpu_count() or 1  # concurrent Scheme processes
+WARM_WORKERS = 0  # persistent interpreter processes, 0 runs one script per task
+WORKER_MAX_RESPAWNS = 3  # consecutive crashes before a warm worker is given up
+RESULT_CACHE_ENTRIES = 256  # in-memory query results
+RESULT_CACHE_DISK_BYTES = 16 * 1024 * 1024  # on-disk query results, 0 disables
+SEARCH_STRATEGY = "sequential"  # allTests search: "sequential" or "race"
+BEST_GUESS_ANSWERS = 1  # allTests candidates streamed to Best Guess, 1 asks for one
+PORTFOLIO_VARIANTS = ()  # INTERP_VARIANTS raced by allTests, empty uses interp only
+TRACE_MAX_SPANS = 10000  # most recent query lifecycle spans kept for export
+TRACE_FILE = ""  # Chrome trace-event JSON written on exit, empty disables
+SEARCH_PROFILE = False  # count interpreter clause work in every query (slower)
+AUTO_REPAIR_PAIRS = False  # auto-repair also tries every pair of holes
+AUTO_REPAIR_MAX_VARIANTS = 64  # holes tried per auto-repair, smallest first
+AUTO_REPAIR_TIMEOUT_MS = 30000  # wall-clock per hole before giving up on it
+PARSE_GATE = True  # tests and allTests wait for the simple query to parse
 
 
 def find_scheme_executable() -> Optional[str]:
@@ -76,17 +133,29 @@ def find_scheme_executable() -> Optional[str]:
     )
 
 
-if SCHEME_EXECUTABLE := find_scheme_executable():
-    l.good(f"Found Scheme executable: {SCHEME_EXECUTABLE}")
-else:
-    l.warn(
-        f"Could not find Scheme executable in PATH. Looked for: {', '.join(['scheme', 'chez', 'chezscheme'])}"
-    )
-    sys.exit(1)
+@functools.cache
+def scheme_executable() -> Optional[str]:
+    """find_scheme_executable(), searched for once on first use."""
+    if executable := find_scheme_executable():
+        l.good(f"Found Scheme executable: {executable}")
+    else:
+        l.warn(
+            f"Could not find Scheme executable in PATH. Looked for: {', '.join(['scheme', 'chez', 'chezscheme'])}"
+        )
+    return executable
+
+
+@functools.cache
+def ensure_tmp_dir() -> str:
+    """TMP_DIR, created on first use."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    return TMP_DIR
+
 
 # Load query strings from files
 
 
+@functools.cache
 def load_safe(file_path: str) -> str:
     try:
         with open(file_path, "r", encoding="utf-8") as f:
@@ -98,11 +167,23 @@ def load_safe(file_path: str) -> str:
         return ""
 
 
-ALLTESTS_STRING_1 = load_safe(INTERP_ALLTESTS_P_1)
-ALLTESTS_STRING_2 = load_safe(INTERP_ALLTESTS_P_2)
-EVAL_STRING_1 = load_safe(INTERP_EVAL_P_1)
-EVAL_STRING_2 = load_safe(INTERP_EVAL_P_2)
-INTERP_SCM = load_safe(INTERP_FULLPATH)
+# Constants that need PATH or the filesystem, computed on first access so
+# that importing this module has no side effects
+_LAZY = {
+    "SCHEME_EXECUTABLE": scheme_executable,
+    "ALLTESTS_STRING_1": lambda: load_safe(INTERP_ALLTESTS_P_1),
+    "ALLTESTS_STRING_2": lambda: load_safe(INTERP_ALLTESTS_P_2),
+    "EVAL_STRING_1": lambda: load_safe(INTERP_EVAL_P_1),
+    "EVAL_STRING_2": lambda: load_safe(INTERP_EVAL_P_2),
+    "INTERP_SCM": lambda: load_safe(INTERP_FULLPATH),
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Default value fields
 
@@ -134,6 +215,7 @@ DEFAULT_TEST_EXPECTED_OUTPUTS = [
 
 LOAD_MK_VICARE_SCM = f'(load "{MK_VICARE_FULLPATH}")'.replace("\\", "\\\\")
 LOAD_MK_SCM = f'(load "{MK_FULLPATH}")'.replace("\\", "\\\\")
+LOAD_INTERP_CLAUSE_SCM = f'(load "{INTERP_CLAUSE_FULLPATH}")'.replace("\\", "\\\\")
 
 SIMPLE_Q = "simple"
 INDIVIDUAL_Q = "individual test"
@@ -1,21 +1,43 @@
-import os
+import time
 
 from PySide6.QtCore import QObject, QTimer, Slot
 from PySide6.QtWidgets import QMainWindow
 
 import qBarliman.utils.log as l
-from qBarliman.constants import TMP_DIR
+from qBarliman.constants import (
+    AUTO_REPAIR_MAX_VARIANTS,
+    AUTO_REPAIR_PAIRS,
+    AUTO_REPAIR_TIMEOUT_MS,
+    BEST_GUESS_ANSWERS,
+    PARSE_GATE,
+    PORTFOLIO_VARIANTS,
+)
 from qBarliman.models.scheme_document import SchemeDocument
+from qBarliman.operations.portfolio import PortfolioStats
+from qBarliman.operations.result_cache import CACHEABLE_STATUSES
+from qBarliman.operations.search_profile import SearchProfile
+from qBarliman.operations.subsumption import implied_results, task_kind
 from qBarliman.operations.scheme_execution_service import (
+    RaceEntrant,
     SchemeExecutionService,
+    TaskResult,
     TaskStatus,
+    has_answer,
 )
-from qBarliman.utils.load_interpreter import load_interpreter_code
+from qBarliman.utils.auto_repair import hole_variants
 from qBarliman.utils.query_builder import QueryBuilder, SchemeQueryType
 from qBarliman.utils.rainbowp import rainbowp
+from qBarliman.utils.sexp import SexpSyntaxError
+from qBarliman.utils.tracing import breakdown, tracer
 from qBarliman.views.editor_window_ui import EditorWindowUI
 
 
+def _elapsed_text(result):
+    """A result's elapsed time, naming the task that decided it if it was not run."""
+    text = f"{result.elapsed_time:.2f}s" if result.elapsed_time is not None else ""
+    return f"{text} ({result.implied_by})".lstrip() if result.implied_by else text
+
+
 class EditorWindowController(QObject):
     def __init__(
         self,
@@ -30,9 +52,10 @@ class EditorWindowController(QObject):
         self.view = EditorWindowUI(self.main_window)
         self.main_window.setCentralWidget(self.view)
 
-        self.query_builder = query_builder or QueryBuilder(load_interpreter_code())
+        self.query_builder = query_builder or QueryBuilder()
         self.execution_service = execution_service or SchemeExecutionService()
         self.model = SchemeDocument()
+        self.portfolio_stats = PortfolioStats()
 
         # Debounce timer
         self.run_code_timer = QTimer()
@@ -41,23 +64,27 @@ class EditorWindowController(QObject):
         self._debounce_interval = 0.5  # seconds
 
         self._pending_task_types = []  # List of task types to run
-        self._current_task_type = None
-        self._task_queue = []  # List of task pids
+        self._task_queue = {}  # task type -> handle of its latest run
+        self._best_guesses = []  # candidates streamed by the running allTests
+        self._scheduled_at = {}  # task type -> time of the edit that last scheduled it
+        self._repairs = {}  # RepairVariant.label -> variant raced by autoRepair
+        self._subsumed = set()  # task types being stopped because they are decided
+        self._parsing = None  # definition_revision of the latest simple run
+        self._parsed = None  # (definition_revision, simple result): the parse check
+        self._gated = {}  # task type -> time it started waiting for the parse check
 
         self._config = {
             "simple": {
                 "update": ("definition_status", lambda r: (r.message, r.status)),
-                "kill": {"pass": False, "fail": True},
             },
             "allTests": {
                 "update": [
                     ("best_guess", lambda r: r.output),
                     (
                         "best_guess_status",
-                        lambda r: (f"{r.elapsed_time:.2f}s", r.status),
+                        lambda r: (_elapsed_text(r), r.status),
                     ),
                 ],
-                "kill": {"pass": False, "fail": False},
             },
             "test": {
                 "update": {
@@ -65,7 +92,7 @@ class EditorWindowController(QObject):
                         "test_status",
                         lambda r: (
                             int(r.task_type[4:]) - 1,
-                            f"{r.elapsed_time:.2f}s",
+                            _elapsed_text(r),
                             r.status,
                         ),
                     ),
@@ -74,7 +101,7 @@ class EditorWindowController(QObject):
                         lambda r: (
                             int(r.task_type[4:]) - 1,
                             (
-                                f"Failed {r.elapsed_time:.2f}s"
+                                f"Failed {_elapsed_text(r)}"
                                 if r.elapsed_time is not None
                                 else "Failed"
                             ),
@@ -82,7 +109,18 @@ class EditorWindowController(QObject):
                         ),
                     ),
                 },
-                "kill": {"pass": False, "fail": True},
+            },
+            "autoRepair": {
+                "update": {
+                    "pass": [
+                        ("best_guess", lambda r: r.output),
+                        ("repair_status", lambda r: (self._repair_text(r), r.status)),
+                    ],
+                    "fail": (
+                        "repair_status",
+                        lambda r: (self._repair_text(r), r.status),
+                    ),
+                },
             },
         }
 
@@ -91,17 +129,24 @@ class EditorWindowController(QObject):
 
         self.model.definitionTextChanged.emit(self.model.definition_text)
         self.model.testCasesChanged.emit(
-            self.model.test_inputs, self.model.test_expected
+            list(self.model.test_inputs), list(self.model.test_expected)
         )
         self.main_window.show()
-        self.run_code("simple")  # Initial run
-
-    def maybe_kill_alltests(self):
-        """Kill all_tests if it is running."""
-        while self._task_queue:
-            l.info(f"Killing task ID: {self._task_queue[0]}")
-            self.execution_service.kill_process(self._task_queue[0])
-            self._task_queue.pop(0)
+        self.run_barliman()  # Initial run
+
+    def _track(self, task_type, handle):
+        """Remembers handle as task_type's latest run; None means its result
+        was already reported, from the cache, so there is nothing to track."""
+        if handle is not None:
+            self._task_queue[task_type] = handle
+
+    def _kill_tasks(self, task_types):
+        """Kill the latest run of each of task_types, if any."""
+        for task_type in task_types:
+            if task_type in self._task_queue:
+                task_id = self._task_queue.pop(task_type)
+                l.info(f"Killing {task_type} task ID: {task_id}")
+                self.execution_service.cancel_task(task_id)
 
     @Slot()
     def _on_definition_text_changed(self):
@@ -109,11 +154,11 @@ class EditorWindowController(QObject):
         l.info("Definition text changed")
         self.run_barliman()
 
-    @Slot()
-    def _on_tests_changed(self):
-        """Handles test case changes and schedules tests."""
-        l.info("Test cases changed")
-        self.run_barliman()
+    @Slot(int)
+    def _on_tests_changed(self, test_number):
+        """Handles a test case change and schedules only what it invalidates."""
+        l.info(f"Test case {test_number} changed")
+        self.run_barliman(test_number)
 
     def _schedule_run_code(self, task_type):
         """Schedules a task, avoiding duplicates."""
@@ -121,6 +166,7 @@ class EditorWindowController(QObject):
         if task_type not in self._pending_task_types:
             l.info(f"Task {task_type} not already scheduled")
             self._pending_task_types.append(task_type)
+        self._scheduled_at[task_type] = time.monotonic()
         self.run_code_timer.start(int(self._debounce_interval * 1000))
 
     @Slot()
@@ -129,64 +175,209 @@ class EditorWindowController(QObject):
         l.info("Running code after debounce")
         for task_type in self._pending_task_types:
             l.info(f"Running task: {task_type}")
-            self.run_code(task_type)
+            tracer.add("debounce", task_type, self._scheduled_at[task_type])
+            if self._gate(task_type):
+                continue
+            with tracer.span("launch", task_type):
+                self.run_code(task_type)
         self._pending_task_types = []
 
-    def _execute_scheme_script(self, task_type, script):
-        self._current_task_type = task_type
-        script_path = os.path.join(TMP_DIR, f"{task_type}.scm")
-        l.info(f"Writing script to {script_path}")
-        with open(script_path, "w") as f:
-            f.write(script)
-        task_id = self.execution_service.execute_scheme(script_path, task_type)
-        l.info(f"Spawned task_id pid {task_id}")
-        self._task_queue.append(task_id)
-        l.info(f"Task queue: {self._task_queue}")
-
-    def run_barliman(self):
-        """Queues simple, test1-n if not empty, and allTests for parallel execution."""
-        self.maybe_kill_alltests()
-        self.view.clear_error_output()
-        l.good("Running Barliman")
-
-        self._schedule_run_code("simple")
+    def _run_race(self, task_type, queries):
+        """Races the variants of a query; only an answer wins, or a complete search."""
+        entrants = []
+        for variant, script in queries.items():
+            entrant = RaceEntrant(variant, script)
+            if variant == "complete":
+                entrant.conclusive = lambda r: r.status in CACHEABLE_STATUSES
+            entrants.append(entrant)
+        return self.execution_service.execute_race(entrants, task_type)
+
+    def _invalidated_tasks(self, test_number=None):
+        """Task types whose results an edit makes stale.
+
+        A definition edit (test_number None) invalidates everything; an edit to
+        test k only invalidates test{k} and allTests.
+        """
+        if test_number is None:
+            tests = range(1, len(self.model.test_inputs) + 1)
+            return ["simple", *(f"test{k}" for k in tests), "allTests"]
+        return [f"test{test_number}", "allTests"]
+
+    def _test_is_filled(self, task_type):
+        index = int(task_type[4:]) - 1
+        return bool(
+            self.model.test_inputs[index].strip()
+            and self.model.test_expected[index].strip()
+        )
 
-        test_inputs = [str(i) for i in self.model.test_inputs]
-        test_expected = [str(o) for o in self.model.test_expected]
+    def run_barliman(self, test_number=None):
+        """Queues simple, test1-n if not empty, and allTests for parallel execution.
 
-        for e, (i, o) in enumerate(zip(test_inputs, test_expected), start=1):
-            if i.strip() and o.strip():
-                l.info(f"Queuing test {e=}: {i=} {o=}")
-                self._schedule_run_code(f"test{e}")
+        With a test_number only that test and allTests are re-run; the other
+        tests keep their last result on screen.
+        """
+        invalidated = self._invalidated_tasks(test_number)
+        for task_type in invalidated:
+            self._gated.pop(task_type, None)
+        self.view.clear_error_output()
+        l.good(f"Running Barliman: {', '.join(invalidated)}")
+
+        emptied = []
+        rejected = []  # malformed, so not worth a process
+        for task_type in invalidated:
+            if task_type.startswith("test") and not self._test_is_filled(task_type):
+                emptied.append(int(task_type[4:]) - 1)
+            elif error := self._syntax_error(task_type):
+                rejected.append(TaskResult(task_type, TaskStatus.SYNTAX_ERROR, error))
+            else:
+                l.info(f"Queuing {task_type}")
+                self._schedule_run_code(task_type)
+                continue
+            self._pending_task_types = [
+                t for t in self._pending_task_types if t != task_type
+            ]
+
+        # Killed after scheduling so their TERMINATED results are recognised as superseded
+        decided = {result.task_type for result in rejected}
+        self._subsumed |= decided
+        self._kill_tasks([*invalidated, "autoRepair"])
+        self._subsumed -= decided
+        for index in emptied:
+            self.view.update_ui("test_status", (index, "", TaskStatus.SUCCESS))
+        if rejected:
+            errors = dict.fromkeys(result.message for result in rejected)
+            self.view.update_ui("error_output", "\n".join(errors))
+        for result in rejected:
+            l.info(f"Not running {result.task_type}: {result.message}")
+            if result.task_type == "simple":
+                self._parsing = self.model.definition_revision
+            self._scheduled_at[result.task_type] = time.monotonic()
+            self._handle_task_result(result)
+
+    def _syntax_error(self, task_type):
+        """Where the text task_type's query would be built from is malformed,
+        or "" if it is well formed."""
+        if error := self.model.definition_syntax_error:
+            return error
+        tests = []
+        if task_type == "allTests":
+            tests = range(1, len(self.model.test_inputs) + 1)
+            tests = [k for k in tests if self._test_is_filled(f"test{k}")]
+        elif task_type.startswith("test"):
+            tests = [int(task_type[4:])]
+        for k in tests:
+            if error := self.model.test_syntax_error(k):
+                return f"Test {k}: {error}"
+        return ""
+
+    def auto_repair(self):
+        """Races allTests over copies of the definition with a subexpression
+        punched out as a hole, smallest hole first; the first copy that
+        synthesis completes to pass every test is the repair."""
+        self._kill_tasks(["autoRepair"])
+        tests = range(1, len(self.model.test_inputs) + 1)
+        if not any(self._test_is_filled(f"test{k}") for k in tests):
+            status = ("No tests to repair against", TaskStatus.FAILED)
+            self.view.update_ui("repair_status", status)
+            return
+        try:
+            variants = hole_variants(
+                self.model.definition_text, AUTO_REPAIR_PAIRS, AUTO_REPAIR_MAX_VARIANTS
+            )
+        except SexpSyntaxError as e:
+            self.view.update_ui("repair_status", (str(e), TaskStatus.SYNTAX_ERROR))
+            return
+        if not variants:
+            status = ("Nothing to repair", TaskStatus.FAILED)
+            self.view.update_ui("repair_status", status)
+            return
 
-        self._schedule_run_code("allTests")
+        l.good(f"Auto-repair: racing {len(variants)} holes")
+        self._repairs = {variant.label: variant for variant in variants}
+        self._scheduled_at["autoRepair"] = time.monotonic()
+        warm = self.execution_service.uses_warm_workers
+        with tracer.span("launch", "autoRepair", variants=len(variants)):
+            entrants = []
+            for variant in variants:
+                data = self.model.snapshot.update_definition_text(
+                    variant.definition_text
+                )
+                # Prints the first answer, or () if there is none
+                query = self.query_builder.build_query(
+                    SchemeQueryType.ALL_TESTS_STREAM, (data, 1), with_prelude=not warm
+                )
+                entrants.append(RaceEntrant(variant.label, query, has_answer))
+            handle = self.execution_service.execute_race(
+                entrants, "autoRepair", AUTO_REPAIR_TIMEOUT_MS
+            )
+            self._track("autoRepair", handle)
+
+    def _repair_text(self, result):
+        """Status text for an autoRepair result: which holes were refilled."""
+        if result.status == TaskStatus.TERMINATED:
+            return "Auto-repair stopped"
+        if not has_answer(result):
+            return f"No repair found: {result.message}"
+        variant = self._repairs.get(result.variant)
+        holes = [" ".join(hole.split()) for hole in variant.holes] if variant else []
+        holes = [hole if len(hole) <= 30 else hole[:27] + "..." for hole in holes]
+        l.good(f"Repaired {', '.join(holes)}: {result.output}")
+        return f"Repaired {', '.join(holes)} in {result.elapsed_time:.2f}s"
 
     def run_code(self, task_type):
         """Runs the Scheme code for a given task type."""
         self.view.clear_error_output()
         l.info(f"Running code for task type: {task_type}")
+        warm = self.execution_service.uses_warm_workers
+        data = self.model.snapshot
         try:
             if task_type == "simple":
+                self._parsing = self.model.definition_revision
                 script = self.query_builder.build_query(
-                    SchemeQueryType.SIMPLE, self.model._data
+                    SchemeQueryType.SIMPLE, data, with_prelude=not warm
                 )
             elif task_type.startswith("test"):
                 index = int(task_type[4:])  # Extract test number
                 script = self.query_builder.build_query(
-                    SchemeQueryType.TEST, (self.model._data, index)
+                    SchemeQueryType.TEST,
+                    (data, index),
+                    with_prelude=not warm,
                 )
-            elif task_type == "allTests":
+            elif task_type == "allTests" and PORTFOLIO_VARIANTS and not warm:
+                # Warm workers only have the default interpreter loaded
+                queries = self.query_builder.build_portfolio_queries(
+                    data,
+                    self.portfolio_stats.ranked(PORTFOLIO_VARIANTS),
+                    BEST_GUESS_ANSWERS,
+                )
+                self._track(task_type, self._run_race(task_type, queries))
+                return
+            elif task_type == "allTests" and BEST_GUESS_ANSWERS > 1:
                 script = self.query_builder.build_query(
-                    SchemeQueryType.ALL_TESTS, self.model._data
+                    SchemeQueryType.ALL_TESTS_STREAM,
+                    (data, BEST_GUESS_ANSWERS),
+                    with_prelude=not warm,
                 )
+            elif task_type == "allTests":
+                queries = self.query_builder.build_all_tests_queries(
+                    data, with_prelude=not warm
+                )
+                if len(queries) > 1:
+                    self._track(task_type, self._run_race(task_type, queries))
+                    return
+                (script,) = queries.values()
             else:
                 l.warn(f"Invalid task type: {task_type}")
                 return
 
             if script:
                 l.good(f"Executing script for {task_type}")
-                l.scheme(rainbowp(script))
-                self._execute_scheme_script(task_type, script)
+                l.scheme(lambda: rainbowp(script))
+                if warm:
+                    task_id = self.execution_service.execute_query(script, task_type)
+                else:
+                    task_id = self.execution_service.execute_source(script, task_type)
+                self._track(task_type, task_id)
         except Exception as e:
             l.warn(f"Error building/running query: {e}")
             self.view.update_ui("error_output", str(e))
@@ -201,6 +392,7 @@ class EditorWindowController(QObject):
             )
         )
 
+        self.view.schemeDefinitionView.codeEdited.connect(self.model.edit_definition)
         self.view.schemeDefinitionView.codeTextChanged.connect(
             self.model.update_definition_text
         )
@@ -214,16 +406,34 @@ class EditorWindowController(QObject):
                 lambda text, idx=i: self.model.update_test_expected(idx + 1, text)
             )
 
-        self.model.definitionTextChanged.connect(self._on_definition_text_changed)
-        self.model.testCasesChanged.connect(self._on_tests_changed)
+        # Layout and comment edits don't change the code, so they don't re-run it
+        self.model.definitionCodeChanged.connect(self._on_definition_text_changed)
+        self.model.testCodeChanged.connect(self._on_tests_changed)
 
+        self.view.autoRepairButton.clicked.connect(self.auto_repair)
         self.execution_service.taskResultReady.connect(self._handle_task_result)
         self.execution_service.processStarted.connect(self._handle_process_started)
+        self.execution_service.partialResultReady.connect(self._handle_partial_result)
 
     def _handle_task_result(self, result):
         """Handles the TaskResult using config dictionary."""
+        if result.status == TaskStatus.TERMINATED:
+            if result.task_type in self._pending_task_types:
+                l.debug(f"Ignoring superseded {result.task_type} run")
+                return
+            if result.task_type in self._subsumed:
+                return  # Its implied result is shown instead
+        else:
+            self._task_queue.pop(result.task_type, None)  # Finished, nothing to kill
+        if result.status == TaskStatus.SUCCESS and result.variant in PORTFOLIO_VARIANTS:
+            self.portfolio_stats.record_win(result.variant)
+
         task = "test" if result.task_type.startswith("test") else result.task_type
-        outcome = "pass" if result.status == TaskStatus.SUCCESS else "fail"
+        if task == "autoRepair":
+            passed = has_answer(result)  # Only an answer is a repair
+        else:
+            passed = result.status == TaskStatus.SUCCESS
+        outcome = "pass" if passed else "fail"
         cfg = self._config.get(task)
 
         if not cfg:
@@ -237,16 +447,97 @@ class EditorWindowController(QObject):
 
         for element, formatter in updates:
             self.view.update_ui(element, formatter(result))
-
-        if cfg["kill"][outcome]:
-            self.maybe_kill_alltests()
+        if result.status != TaskStatus.TERMINATED:
+            self._show_breakdown(result)
+            self._settle_implied(result)
+        if result.task_type == "simple":
+            self._release_gated(result)
+
+    def _gate(self, task_type):
+        """Holds a test or allTests back while the simple query checks that the
+        definition parses, so a parse error is found by one process, not all.
+
+        Returns whether task_type was held back, or settled by a known check.
+        """
+        if not PARSE_GATE or task_kind(task_type) not in ("test", "allTests"):
+            return False
+        if self._parsed and self._parsed[0] == self.model.definition_revision:
+            implied = implied_results(self._parsed[1], [task_type])
+            for result in implied:
+                self._handle_task_result(result)
+            return bool(implied)
+        if "simple" in self._task_queue or "simple" in self._pending_task_types:
+            self._gated[task_type] = time.monotonic()
+            return True
+        return False
+
+    def _release_gated(self, result):
+        """Settles the tasks waiting for the parse check with what the simple
+        result implies for them, and launches the rest."""
+        if result.status != TaskStatus.TERMINATED:
+            self._parsed = (self._parsing, result)
+        if self._parsing != self.model.definition_revision:
+            return
+        gated, self._gated = self._gated, {}
+        implied = {r.task_type: r for r in implied_results(result, gated)}
+        for task_type, gated_at in gated.items():
+            tracer.add("parse gate", task_type, gated_at)
+            if task_type in implied:
+                self._handle_task_result(implied[task_type])
+                continue
+            with tracer.span("launch", task_type):
+                self.run_code(task_type)
+
+    def _settle_implied(self, result):
+        """Stops the running tasks that result decides, showing what it implies."""
+        running = [t for t in self._task_queue if t not in self._pending_task_types]
+        for implied in implied_results(result, running):
+            l.info(f"{result.task_type} decides {implied.task_type}: {implied.message}")
+            self._subsumed.add(implied.task_type)
+            self._kill_tasks([implied.task_type])
+            self._subsumed.discard(implied.task_type)
+            self._handle_task_result(implied)
+
+    def _show_breakdown(self, result):
+        """Shows where the time went between the edit and result, and, for a
+        profiled query, which interpreter clauses the search spent it in."""
+        task_type = result.task_type
+        if (scheduled_at := self._scheduled_at.get(task_type)) is None:
+            return
+        spans = tracer.since(task_type, scheduled_at)
+        total = (time.monotonic() - scheduled_at) * 1000
+        text = f"{breakdown(spans)}\ntotal: {total:.1f} ms".lstrip()
+        l.info("%s latency:\n%s", task_type, text)
+        if result.profile and (profile := SearchProfile.parse(result.profile)):
+            summary = profile.summary()
+            l.info("%s search profile:\n%s", task_type, summary)
+            text += f"\n\nsearch profile:\n{summary}"
+        self.view.update_ui("latency", (task_type, text))
 
     @Slot(str)
     def _handle_process_started(self, task_type):
         if task_type == "simple":
             self.view.update_ui("definition_status", ("???", TaskStatus.THINKING))
         elif task_type == "allTests":
+            self._best_guesses = []
             self.view.update_ui("best_guess_status", ("???", TaskStatus.THINKING))
+        elif task_type == "autoRepair":
+            text = f"Trying {len(self._repairs)} holes..."
+            self.view.update_ui("repair_status", (text, TaskStatus.THINKING))
         elif task_type.startswith("test"):
             index = int(task_type[4:]) - 1
             self.view.update_ui("test_status", (index, "???", TaskStatus.THINKING))
+
+    @Slot(TaskResult)
+    def _handle_partial_result(self, result):
+        """Shows each allTests candidate in Best Guess as soon as it is found."""
+        if result.task_type != "allTests" or result.output == "()":
+            return
+        if result.output in self._best_guesses:
+            return  # Found again by another interpreter in the portfolio
+        self._best_guesses.append(result.output)
+        self.view.update_ui("best_guess", "\n\n".join(self._best_guesses))
+        self.view.update_ui(
+            "best_guess_status",
+            (f"{len(self._best_guesses)} found, searching", TaskStatus.THINKING),
+        )
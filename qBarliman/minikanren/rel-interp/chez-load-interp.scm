@@ -1,3 +1,4 @@
 (load "mk/mk-vicare.scm")
 (load "mk/mk.scm")
+(load "interp-clause.scm")
 (load "interp.scm")
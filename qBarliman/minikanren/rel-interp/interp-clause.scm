@@ -0,0 +1,10 @@
+;; (eval-clause label g0 g ...) wraps each clause of eval-expo in interp.scm;
+;; load this file after mk.scm and before interp.scm.  It expands to the
+;; conjunction the clause would be without it, so the search is unchanged.
+;; templates/barliman-search-profile.scm, loaded between the two instead,
+;; redefines it to count the work done in each labelled clause.
+
+(define-syntax eval-clause
+  (syntax-rules ()
+    ((_ label g0 g ...)
+     (lambdag@ (st) (bind*-depth st g0 g ...)))))
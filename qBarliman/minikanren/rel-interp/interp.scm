@@ -423,6 +423,7 @@
     ; Variadic
     ((symbolo params))))
 
+;; Each clause is wrapped in eval-clause, defined in interp-clause.scm.
 (define (eval-expo-rest expr env val)
   (lambdag@ (st)
     (let* ((expr (walk expr (state-S st)))
@@ -431,16 +432,17 @@
            (goal (lambdag@ (st)
                    ((conde-weighted
     (5000 1 (conde$-dfs
-              ((== `(quote ,val) expr)
-               (absento 'closure val)
-               (absento 'prim val)
-               (not-in-envo 'quote env))
+              ((eval-clause quote
+                 (== `(quote ,val) expr)
+                 (absento 'closure val)
+                 (absento 'prim val)
+                 (not-in-envo 'quote env)))
 
-              ((numbero expr) (== expr val))
+              ((eval-clause number (numbero expr) (== expr val)))
 
-              ((boolean-primo expr val))
+              ((eval-clause boolean (boolean-primo expr val)))
 
-              ((fresh (rator rands rator-val)
+              ((eval-clause application (fresh (rator rands rator-val)
                  (== `(,rator . ,rands) expr)
                  (eval-expo rator env rator-val)
                  (conde$-dfs
@@ -461,36 +463,36 @@
                          ;(project (rator) (lambdag@ (st) ((begin (display `(happened ,rator)) (newline) succeed) st)))
                          (== `((val . (,x . ,a*)) . ,env^) res)
                          (eval-expo body res val)
-                         (eval-listo rands env a*))))))))))
+                         (eval-listo rands env a*)))))))))))
 
-    (#f #f (if-primo expr env val))
+    (#f #f (eval-clause if (if-primo expr env val)))
 
-    (1 1 (fresh (x body)
+    (1 1 (eval-clause lambda (fresh (x body)
        (== `(lambda ,x ,body) expr)
        (== `(closure (lambda ,x ,body) ,env) val)
        (paramso x)
-       (not-in-envo 'lambda env)))
+       (not-in-envo 'lambda env))))
 
     ;; WEB 25 May 2016 -- This rather budget version of 'begin' is
     ;; useful for separating 'define' from the expression 'e',
     ;; specifically for purposes of Barliman.
-    (1 1 (fresh (begin-body)
+    (1 1 (eval-clause begin (fresh (begin-body)
        (== `(begin . ,begin-body) expr)
        (not-in-envo 'begin env)
-       (eval-begino '() begin-body env val)))
+       (eval-begino '() begin-body env val))))
 
-    (1 1 (fresh (b* letrec-body)
+    (1 1 (eval-clause letrec (fresh (b* letrec-body)
        (== `(letrec ,b* ,letrec-body) expr)
        (not-in-envo 'letrec env)
-       (eval-letreco b* letrec-body env val)))
+       (eval-letreco b* letrec-body env val))))
 
-    (1 1 (cond-primo expr env val))
+    (1 1 (eval-clause cond (cond-primo expr env val)))
 
-    (1 1 (handle-matcho expr env val))
+    (1 1 (eval-clause match (handle-matcho expr env val)))
 
-    (1 1 (prim-expo expr env val))
+    (1 1 (eval-clause primitive (prim-expo expr env val)))
 
-    (1 1 (fresh (b* body)
+    (1 1 (eval-clause let (fresh (b* body)
            (== `(let ,b* ,body) expr)
            (not-in-envo 'let env)
            (let loop ((b* b*) (p* '()) (rand* '()))
@@ -502,9 +504,9 @@
                ((fresh (p rand b*-rest)
                   (== `((,p ,rand) . ,b*-rest) b*)
                   (symbolo p)
-                  (loop b*-rest (cons p p*) (cons rand rand*))))))))
+                  (loop b*-rest (cons p p*) (cons rand rand*)))))))))
 
-    (1 1 (fresh (b* body)
+    (1 1 (eval-clause let* (fresh (b* body)
            (== `(let* ,b* ,body) expr)
            (not-in-envo 'let env)
            (let loop ((b* b*) (env env))
@@ -515,12 +517,12 @@
                   (symbolo p)
                   (== `((val . (,p . ,a)) . ,env) res)
                   (loop b*-rest res)
-                  (eval-expo rand env a)))))))
+                  (eval-expo rand env a))))))))
 
-    (1 1 (fresh (qq-expr)
+    (1 1 (eval-clause quasiquote (fresh (qq-expr)
            (== (list 'quasiquote qq-expr) expr)
            (not-in-envo 'quasiquote env)
-           (eval-qq-expo qq-expr env val)))
+           (eval-qq-expo qq-expr env val))))
 
     ) (state-depth-set st depth)))))
 
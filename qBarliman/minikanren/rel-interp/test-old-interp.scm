@@ -1,6 +1,7 @@
 (load "mk/mk-vicare.scm")
 (load "mk/mk.scm")
 (load "mk/test-check.scm")
+(load "interp-clause.scm")
 (load "interp.scm")
 
 (set! enable-conde1? #t)
@@ -0,0 +1,20 @@
+;; Barliman helpers for interpreter variants that don't define them
+;; (copied from rel-interp/interp.scm). Load after mk.scm.
+
+(define (extract-nameso list-of-defns names)
+  (conde
+    ((== '() list-of-defns)
+     (== '() names))
+    ((fresh (name ignore rest res)
+       (== `((define ,name . ,ignore) . ,rest) list-of-defns)
+       (== `(,name . ,res) names)
+       (symbolo name)
+       (extract-nameso rest res)))))
+
+(define (appendo l s out)
+  (conde
+    ((== '() l) (== s out))
+    ((fresh (a d res)
+       (== `(,a . ,d) l)
+       (== `(,a . ,res) out)
+       (appendo d s res)))))
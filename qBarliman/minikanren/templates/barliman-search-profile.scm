@@ -0,0 +1,112 @@
+;; Search profiler for qBarliman, off unless search-profile-start! is called.
+;; Load after rel-interp/interp-clause.scm and before interp.scm: it
+;; redefines eval-clause, which wraps each clause of eval-expo, to count the
+;; clause.  Without this file eval-clause adds nothing, so unprofiled
+;; queries pay nothing.
+;;
+;; While on, each profiled clause counts the times it is entered and the
+;; states it produces, with the deepest conde nesting and the total
+;; substitution and constraint store sizes it was entered with; == counts
+;; unifications, and state-depth-deepen the branches max-search-depth cut.
+;; Counts are printed to stdout as one line,
+;;
+;;   #qbarliman-profile ((== tried failed) (depth-limit cut)
+;;                       (label entered produced max-depth subst-total store-total) ...)
+;;
+;; every search-profile-report-every entries, so that a search killed
+;; before it finishes still leaves recent counts, and by search-profile-finish!.
+
+(define search-profile #f)  ; alist of label -> counts vector while on
+(define search-profile-unifications 0)
+(define search-profile-failed-unifications 0)
+(define search-profile-pruned 0)
+(define search-profile-entries 0)
+(define search-profile-report-every 100000)
+
+(define constraint-store-size t:size)
+
+(define (search-profile-start!)
+  (set! search-profile '())
+  (set! search-profile-unifications 0)
+  (set! search-profile-failed-unifications 0)
+  (set! search-profile-pruned 0)
+  (set! search-profile-entries 0))
+
+(define (search-profile-stop!)
+  (set! search-profile #f))
+
+(define (search-profile-finish!)
+  (search-profile-report)
+  (search-profile-stop!))
+
+(define (search-profile-counts label)
+  (cond
+    ((assq label search-profile) => cdr)
+    (else
+      (let ((counts (make-vector 5 0)))
+        (set! search-profile (cons (cons label counts) search-profile))
+        counts))))
+
+(define (search-profile-count! counts i n)
+  (vector-set! counts i (+ n (vector-ref counts i))))
+
+(define (search-profile-enter! label st)
+  (let ((counts (search-profile-counts label)))
+    (search-profile-count! counts 0 1)
+    (vector-set! counts 2 (max (state-depth st) (vector-ref counts 2)))
+    (search-profile-count! counts 3 (subst-length (state-S st)))
+    (search-profile-count! counts 4 (constraint-store-size (state-C st))))
+  (set! search-profile-entries (+ 1 search-profile-entries))
+  (when (zero? (modulo search-profile-entries search-profile-report-every))
+    (search-profile-report)))
+
+(define (search-profile-exit! label)
+  (search-profile-count! (search-profile-counts label) 1 1))
+
+(define (search-profile-report)
+  (when search-profile
+    (let ((port (current-output-port)))
+      (newline port)
+      (display "#qbarliman-profile " port)
+      (write `((== ,search-profile-unifications ,search-profile-failed-unifications)
+               (depth-limit ,search-profile-pruned)
+               . ,(map (lambda (entry) (cons (car entry) (vector->list (cdr entry))))
+                       (reverse search-profile)))
+             port)
+      (newline port)
+      (flush-output-port port))))
+
+(define-syntax eval-clause
+  (syntax-rules ()
+    ((_ label g0 g ...)
+     (lambdag@ (st)
+       (if search-profile
+         (begin
+           (search-profile-enter! 'label st)
+           (bind (bind*-depth st g0 g ...)
+                 (lambdag@ (st) (search-profile-exit! 'label) st)))
+         (bind*-depth st g0 g ...))))))
+
+;; == and state-depth-deepen, counting.  Both return a state, or #f when
+;; they fail; code loaded after this file calls these definitions.
+
+(define ==
+  (let ((== ==))
+    (lambda (u v)
+      (let ((g (== u v)))
+        (lambdag@ (st)
+          (let ((st^ (g st)))
+            (when search-profile
+              (set! search-profile-unifications (+ 1 search-profile-unifications))
+              (unless st^
+                (set! search-profile-failed-unifications
+                  (+ 1 search-profile-failed-unifications))))
+            st^))))))
+
+(define state-depth-deepen
+  (let ((state-depth-deepen state-depth-deepen))
+    (lambda (st)
+      (let ((st^ (state-depth-deepen st)))
+        (when (and search-profile (not st^))
+          (set! search-profile-pruned (+ 1 search-profile-pruned)))
+        st^))))
@@ -0,0 +1,12 @@
+;; Runs the program on stdin, like scheme --script does for a file.
+;;
+;;   scheme --script barliman-stdin.scm < query.scm
+;;
+;; Forms are read and evaluated one at a time, so a form may use what the
+;; forms before it defined.  As with a script, an error ends the process
+;; with a non-zero exit status.
+
+(let loop ((form (read)))
+  (unless (eof-object? form)
+    (eval form)
+    (loop (read))))
@@ -0,0 +1,66 @@
+;; Long-lived query worker for qBarliman.
+;;
+;;   scheme --script barliman-worker.scm mk-vicare.scm mk.scm ... interp.scm
+;;
+;; Loads every file named on the command line once, then serves queries
+;; read from stdin until EOF.  A request is a line holding the payload
+;; length in characters, followed by the payload: zero or more top-level
+;; forms.  Each request is evaluated in a fresh copy of the loaded
+;; environment, so definitions made by one query never leak into the next.
+;;
+;; Every request is answered on stdout with a header line
+;;
+;;   #qbarliman-result <status> <length>
+;;
+;; followed by <length> characters: the output the query printed when
+;; <status> is `ok`, or the condition message when <status> is `error`.
+
+(for-each load (command-line-arguments))
+
+(define worker-environment (interaction-environment))
+
+(define (read-request ip)
+  (let ((header (get-line ip)))
+    (if (eof-object? header)
+        header
+        (get-string-n ip (string->number header)))))
+
+(define (eval-request payload)
+  (let ((env (copy-environment worker-environment #t))
+        (ip (open-string-input-port payload)))
+    (disallow-incomplete-search)
+    (when (top-level-bound? 'search-profile-stop!)  ; profiled interpreter
+      (search-profile-stop!))
+    (let loop ((form (read ip)))
+      (unless (eof-object? form)
+        (eval form env)
+        (loop (read ip))))))
+
+(define (condition->string c)
+  (if (condition? c)
+      (condition/report-string c)
+      (format "~s" c)))
+
+(define (run-request payload)
+  (let ((out (open-output-string)))
+    (guard (c (#t (values "error" (condition->string c))))
+      (parameterize ((current-output-port out))
+        (eval-request payload))
+      (values "ok" (get-output-string out)))))
+
+(define (write-response op status text)
+  (display "#qbarliman-result " op)
+  (display status op)
+  (display " " op)
+  (display (string-length text) op)
+  (newline op)
+  (display text op)
+  (flush-output-port op))
+
+(let ((ip (current-input-port))
+      (op (current-output-port)))
+  (let serve ((payload (read-request ip)))
+    (unless (eof-object? payload)
+      (let-values (((status text) (run-request payload)))
+        (write-response op status text))
+      (serve (read-request ip)))))
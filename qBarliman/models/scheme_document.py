@@ -1,8 +1,8 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from PySide6.QtCore import QObject, Signal
 
-from qBarliman.utils import log as l
+from qBarliman.utils.incremental_reader import IncrementalReader
 
 from ..constants import (
     DEFAULT_DEFINITIONS,
@@ -13,12 +13,21 @@ from .scheme_document_data import SchemeDocumentData
 
 
 class SchemeDocument(QObject):
-    """QObject wrapper around an immutable SchemeDocumentData."""
+    """QObject wrapper around the current revision, an immutable
+    SchemeDocumentData.
+
+    Every edit makes a new revision with a higher revision number. Results
+    computed from the document can be keyed on a revision number instead of
+    the text they were computed from.
+    """
 
     # Signals for changes.
-    definitionTextChanged = Signal(str)
+    definitionTextChanged = Signal(str)  # not for edits the editor reports
     testCasesChanged = Signal(list, list)
     statusChanged = Signal(str)
+    # Emitted only when the code itself changes, not its layout or comments
+    definitionCodeChanged = Signal(int)  # definition_revision
+    testCodeChanged = Signal(int)  # test number
 
     def __init__(
         self,
@@ -30,30 +39,97 @@ class SchemeDocument(QObject):
         self._data = SchemeDocumentData(
             definition_text=definition_text,
             test_inputs=(
-                test_inputs if test_inputs is not None else DEFAULT_TEST_INPUTS.copy()
+                test_inputs if test_inputs is not None else DEFAULT_TEST_INPUTS
             ),
             test_expected=(
                 test_expected
                 if test_expected is not None
-                else DEFAULT_TEST_EXPECTED_OUTPUTS.copy()
+                else DEFAULT_TEST_EXPECTED_OUTPUTS
             ),
         )
+        # Read again on every edit, so syntax errors are known as soon as typed
+        self._definition_reader = IncrementalReader()
+        self._definition_reader.update(self._data.definition_text)
+        self._definition_revision = self._data.revision
+        # (input reader, expected output reader) of each test; outputs are
+        # not spliced into a quasiquote
+        self._test_readers: List[tuple[IncrementalReader, IncrementalReader]] = []
+        self._read_tests()
         self.definitionTextChanged.emit(self.definition_text)
-        self.testCasesChanged.emit(self.test_inputs, self.test_expected)
+        self._emit_test_cases()
+
+    def _read_definition(self, edit: Optional[tuple[int, int, int]] = None) -> None:
+        self._definition_reader.update(self._data.definition_text, edit)
+        if self._definition_reader.code_changed:
+            self._definition_revision = self._data.revision
+            self.definitionCodeChanged.emit(self._definition_revision)
+
+    def _read_tests(self) -> List[int]:
+        """Read the tests again; returns the numbers of those whose code changed."""
+        tests = list(zip(self._data.test_inputs, self._data.test_expected))
+        while len(self._test_readers) < len(tests):
+            self._test_readers.append((IncrementalReader(), IncrementalReader(0)))
+        changed = []
+        for number, ((i, o), readers) in enumerate(zip(tests, self._test_readers), 1):
+            input_reader, expected_reader = readers
+            input_reader.update(i)
+            expected_reader.update(o)
+            if input_reader.code_changed or expected_reader.code_changed:
+                changed.append(number)
+        return changed
+
+    def _emit_test_cases(self) -> None:
+        self.testCasesChanged.emit(
+            list(self._data.test_inputs), list(self._data.test_expected)
+        )
+
+    def _emit_test_code_changes(self) -> None:
+        for number in self._read_tests():
+            self.testCodeChanged.emit(number)
+
+    @property
+    def snapshot(self) -> SchemeDocumentData:
+        """The current revision, which later edits leave as it is."""
+        return self._data
+
+    @property
+    def revision(self) -> int:
+        return self._data.revision
+
+    @property
+    def definition_revision(self) -> int:
+        """The revision the definition's code last changed at."""
+        return self._definition_revision
 
     @property
     def definition_text(self) -> str:
         return self._data.definition_text
 
     @property
-    def test_inputs(self) -> List[str]:
-        l.info(f"{self._data.test_inputs=}")
-        return self._data.test_inputs.copy()
+    def test_inputs(self) -> Tuple[str, ...]:
+        return self._data.test_inputs
+
+    @property
+    def test_expected(self) -> Tuple[str, ...]:
+        return self._data.test_expected
 
     @property
-    def test_expected(self) -> List[str]:
-        l.info(f"{self._data.test_expected=}")
-        return self._data.test_expected.copy()
+    def canonical_definition(self) -> str:
+        return self._definition_reader.canonical
+
+    @property
+    def definition_syntax_error(self) -> str:
+        """Where the definition is malformed, or "" if it is well formed."""
+        return self._definition_reader.describe_error()
+
+    def test_syntax_error(self, test_number: int) -> str:
+        """Where test test_number is malformed, or "" if it is well formed."""
+        input_reader, expected_reader = self._test_readers[test_number - 1]
+        if error := input_reader.describe_error():
+            return f"{error} in the input"
+        if error := expected_reader.describe_error():
+            return f"{error} in the expected output"
+        return ""
 
     @property
     def status(self) -> str:
@@ -67,6 +143,17 @@ class SchemeDocument(QObject):
         if new_text != self._data.definition_text:  # Only update if text changed
             self._data = self._data.update_definition_text(new_text)
             self.definitionTextChanged.emit(new_text)
+            self._read_definition()
+
+    def edit_definition(self, position: int, removed: int, inserted: str) -> None:
+        """Apply an edit reported by the editor: removed characters at position
+        replaced with inserted. The editor already shows it, so
+        definitionTextChanged is not emitted."""
+        old = self._data.definition_text
+        if old[position : position + removed] == inserted:
+            return  # A formatting change
+        self._data = self._data.edit_definition_text(position, removed, inserted)
+        self._read_definition((position, removed, len(inserted)))
 
     def update_test_input(self, test_number: int, value: str) -> None:
         index = test_number - 1
@@ -77,9 +164,8 @@ class SchemeDocument(QObject):
             and self._data.test_inputs[index] != str_value
         ):
             self._data = self._data.update_test_input(index, str_value)
-            self.testCasesChanged.emit(
-                self._data.test_inputs.copy(), self._data.test_expected.copy()
-            )
+            self._emit_test_cases()
+            self._emit_test_code_changes()
 
     def update_test_expected(self, test_number: int, value: str) -> None:
         index = test_number - 1
@@ -90,23 +176,23 @@ class SchemeDocument(QObject):
             and self._data.test_expected[index] != str_value
         ):
             self._data = self._data.update_test_expected(index, str_value)
-            self.testCasesChanged.emit(
-                self._data.test_inputs.copy(), self._data.test_expected.copy()
-            )
+            self._emit_test_cases()
+            self._emit_test_code_changes()
 
     def update_tests(self, inputs: List[str], expected: List[str]) -> None:
-        # Convert inputs/expected to string lists
-        str_inputs = [str(x.text() if hasattr(x, "text") else x) for x in inputs]
-        str_expected = [str(x.text() if hasattr(x, "text") else x) for x in expected]
+        # Convert inputs/expected to string tuples
+        str_inputs = tuple(str(x.text() if hasattr(x, "text") else x) for x in inputs)
+        str_expected = tuple(
+            str(x.text() if hasattr(x, "text") else x) for x in expected
+        )
 
         if (
             str_inputs != self._data.test_inputs
             or str_expected != self._data.test_expected
         ):
             self._data = self._data.update_tests(str_inputs, str_expected)
-            self.testCasesChanged.emit(
-                self._data.test_inputs.copy(), self._data.test_expected.copy()
-            )
+            self._emit_test_cases()
+            self._emit_test_code_changes()
 
     def validate(self) -> bool:
         new_data = self._data.validate()
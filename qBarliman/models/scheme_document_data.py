@@ -1,32 +1,55 @@
 from dataclasses import dataclass, replace
-from typing import List
+from typing import Sequence, Tuple
 
 
 @dataclass(frozen=True)
 class SchemeDocumentData:
+    """One revision of a document. Revisions share the fields an edit leaves
+    unchanged, so making one costs the size of the edit's field."""
+
     definition_text: str
-    test_inputs: List[str]
-    test_expected: List[str]
+    test_inputs: Tuple[str, ...]
+    test_expected: Tuple[str, ...]
     status: str = ""
     is_valid: bool = True
+    revision: int = 0  # increases with every edit
+
+    def __post_init__(self):
+        # Tuples, so they can be handed out and shared without copying
+        object.__setattr__(self, "test_inputs", tuple(self.test_inputs))
+        object.__setattr__(self, "test_expected", tuple(self.test_expected))
 
     def update_definition_text(self, new_text: str) -> "SchemeDocumentData":
-        return replace(self, definition_text=new_text)
+        return replace(self, definition_text=new_text, revision=self.revision + 1)
+
+    def edit_definition_text(
+        self, position: int, removed: int, inserted: str
+    ) -> "SchemeDocumentData":
+        """Replace removed characters at position with inserted."""
+        text = self.definition_text
+        return self.update_definition_text(
+            f"{text[:position]}{inserted}{text[position + removed :]}"
+        )
 
     def update_test_input(self, index: int, value: str) -> "SchemeDocumentData":
-        new_inputs = self.test_inputs.copy()
-        new_inputs[index] = value
-        return replace(self, test_inputs=new_inputs)
+        inputs = self.test_inputs
+        new_inputs = (*inputs[:index], value, *inputs[index + 1 :])
+        return replace(self, test_inputs=new_inputs, revision=self.revision + 1)
 
     def update_test_expected(self, index: int, value: str) -> "SchemeDocumentData":
-        new_expected = self.test_expected.copy()
-        new_expected[index] = value
-        return replace(self, test_expected=new_expected)
+        expected = self.test_expected
+        new_expected = (*expected[:index], value, *expected[index + 1 :])
+        return replace(self, test_expected=new_expected, revision=self.revision + 1)
 
     def update_tests(
-        self, inputs: List[str], expected: List[str]
+        self, inputs: Sequence[str], expected: Sequence[str]
     ) -> "SchemeDocumentData":
-        return replace(self, test_inputs=inputs.copy(), test_expected=expected.copy())
+        return replace(
+            self,
+            test_inputs=tuple(inputs),
+            test_expected=tuple(expected),
+            revision=self.revision + 1,
+        )
 
     def validate(self) -> "SchemeDocumentData":
         # For simplicity, we mark valid if the definition text is non-empty.
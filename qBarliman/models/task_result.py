@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Optional
+
+
+class TaskStatus(Enum):
+    SUCCESS = auto()
+    PARSE_ERROR = auto()
+    SYNTAX_ERROR = auto()
+    EVALUATION_FAILED = auto()
+    THINKING = auto()
+    FAILED = auto()
+    TERMINATED = auto()
+    TIMEOUT = auto()
+    CPU_LIMIT = auto()
+    OOM = auto()
+
+
+@dataclass
+class TaskResult:
+    task_type: str
+    status: TaskStatus
+    message: str
+    output: str = ""
+    elapsed_time: Optional[float] = None
+    variant: str = ""  # which of several raced queries produced this result
+    profile: str = ""  # latest search profile a profiled query printed
+    implied_by: str = ""  # task type whose result decided this one, if not run
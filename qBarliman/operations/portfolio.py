@@ -0,0 +1,44 @@
+import json
+import os
+from typing import Dict, Iterable, List
+
+from qBarliman.constants import PORTFOLIO_STATS_PATH
+from qBarliman.utils import log as l
+
+
+class PortfolioStats:
+    """Race wins per interpreter variant, kept on disk between sessions.
+
+    Variants are ranked by wins so the one that usually answers first is
+    started first, and gets a worker slot when there are too few for all.
+    """
+
+    def __init__(self, path: str = PORTFOLIO_STATS_PATH):
+        self.path = path
+        self.wins: Dict[str, int] = self._load()
+
+    def ranked(self, variants: Iterable[str]) -> List[str]:
+        """variants, most wins first; ties keep their given order."""
+        return sorted(variants, key=lambda v: -self.wins.get(v, 0))
+
+    def record_win(self, variant: str):
+        self.wins[variant] = self.wins.get(variant, 0) + 1
+        l.info(f"Interpreter {variant} won the portfolio ({self.wins[variant]} wins)")
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.wins, f)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            l.warn(f"Could not save portfolio stats {self.path}: {e}")
+
+    def _load(self) -> Dict[str, int]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                wins = json.load(f)
+            return {str(k): int(v) for k, v in wins.items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            l.warn(f"Ignoring unreadable portfolio stats {self.path}: {e}")
+            return {}
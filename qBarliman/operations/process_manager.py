@@ -1,35 +1,103 @@
+import codecs
 import collections
-from typing import Deque
+import itertools
+import os
+import signal
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
 
-from PySide6.QtCore import QObject, QProcess, Signal, Slot
+from PySide6.QtCore import QCoreApplication, QObject, QProcess, QTimer, Signal, Slot
 
+from qBarliman.constants import MAX_WORKERS
 from qBarliman.utils import log as l
 
+# Task ids are unique across every process runner in the application
+_task_ids = itertools.count(1)
+
+
+def next_task_id() -> int:
+    return next(_task_ids)
+
+
+def signed_exit_code(exit_code: int, exit_status: QProcess.ExitStatus) -> int:
+    """Exit code, or minus the signal number if the process was killed by one."""
+    if exit_status == QProcess.ExitStatus.CrashExit and os.name == "posix":
+        return -exit_code  # Qt reports the signal as the exit code
+    return exit_code
+
+
+def start_in_own_session(process: QProcess):
+    """Make process lead a new session, so it and its children share a group."""
+    if os.name == "posix":
+        process.setUnixProcessParameters(QProcess.UnixProcessFlag.CreateNewSession)
+
+
+def kill_process_group(process: QProcess):
+    """SIGKILL a process started with start_in_own_session and all its children."""
+    pid = process.processId()
+    if pid > 0 and hasattr(os, "killpg"):
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        except OSError as e:
+            l.warn(f"Error killing process group {pid}: {e}")
+    process.kill()
+
+
+@dataclass
+class ProcessTask:
+    """A queued or running external process."""
+
+    task_id: int
+    command: str
+    arguments: list[str]
+    task_type: str
+    stdin: Optional[bytes] = None  # written to the process, then closed
+    process: Optional[QProcess] = None
+    # Reads can split a multi-byte character, so each stream keeps its state
+    stdout_decoder: codecs.IncrementalDecoder = field(
+        default_factory=lambda: codecs.getincrementaldecoder("utf-8")("replace")
+    )
+    stderr_decoder: codecs.IncrementalDecoder = field(
+        default_factory=lambda: codecs.getincrementaldecoder("utf-8")("replace")
+    )
+
 
 class ProcessManager(QObject):
-    """Manages a queue of external process executions."""
+    """Runs external processes on a bounded pool of concurrent QProcess slots."""
 
     processStarted = Signal(int, str)  # PID, task_type
     processOutput = Signal(str, str, str)  # stdout, stderr, task_type
     processFinished = Signal(int, str)  # exit code, task_type
     processError = Signal(str, str)  # error message, task_type
 
-    def __init__(self, parent=None):
+    # Per-task routing, keyed by the id returned from enqueue_process
+    taskStarted = Signal(int, int)  # task_id, PID
+    taskOutput = Signal(int, str, str)  # task_id, stdout, stderr
+    taskFinished = Signal(int, int)  # task_id, exit code or -signal if killed
+    taskError = Signal(int, str)  # task_id, error message
+
+    def __init__(self, parent=None, max_workers: Optional[int] = None):
         super().__init__(parent)
-        self._process = QProcess(self)
-        self._queue: Deque[tuple[str, list[str], str]] = (
-            collections.deque()
-        )  # command, args, task_type
-        self._current_task_type = ""
-
-        self._process.readyReadStandardOutput.connect(self._handle_stdout)
-        self._process.readyReadStandardError.connect(self._handle_stderr)
-        self._process.finished.connect(self._on_process_finished)
-        self._process.errorOccurred.connect(self._handle_error)
-
-    def _log_process_state(self, event: str):
+        self.max_workers = max(1, max_workers or MAX_WORKERS)
+        self._queue: Deque[ProcessTask] = collections.deque()
+        self._running: Dict[int, ProcessTask] = {}
+
+        # Starts are deferred to the event loop so callers can register the
+        # returned task id before any signal for it is emitted.
+        self._start_timer = QTimer(self)
+        self._start_timer.setSingleShot(True)
+        self._start_timer.timeout.connect(self._start_pending_processes)
+
+        if app := QCoreApplication.instance():
+            app.aboutToQuit.connect(self.shutdown)
+
+    def _log_process_state(self, event: str, task: ProcessTask):
+        if not l.enabled(3):
+            return
         state_str = "Unknown"
-        state = self._process.state()
+        state = task.process.state() if task.process else QProcess.NotRunning
         if state == QProcess.NotRunning:
             state_str = "NotRunning"
         elif state == QProcess.Starting:
@@ -37,51 +105,141 @@ class ProcessManager(QObject):
         elif state == QProcess.Running:
             state_str = "Running"
 
-        l.debug(f"QProcess State Change: {event} - State: {state_str}")
-
-    @Slot(str, list, str)
-    def enqueue_process(self, command: str, arguments: list[str], task_type: str):
-        """Add a process to the execution queue."""
-        self._log_process_state("enqueue_process - Before Check")
-        self._queue.append((command, arguments, task_type))
-        # MODIFIED CHECK: Only start if state is NotRunning
-        if self._process.state() == QProcess.NotRunning:
-            self._log_process_state("enqueue_process - Starting Next Process")
-            self._start_next_process()
-        else:
-            self._log_process_state(
-                "enqueue_process - Process Already Running or Starting"
-            )
-
-    def _start_next_process(self):
-        """Start the next process in the queue."""
-        self._log_process_state("_start_next_process - Entry")
-        if self._queue:
-            command, arguments, task_type = self._queue.popleft()
-            self._current_task_type = task_type
-            self._log_process_state("_start_next_process - Starting Process")
-            self._process.start(command, arguments)
-            self.processStarted.emit(self._process.processId(), task_type)
-        else:
-            self._log_process_state("_start_next_process - Queue Empty")
-
-    def _handle_stdout(self):
-        if data := self._process.readAllStandardOutput().data().decode():
-            self.processOutput.emit(data, "", self._current_task_type)
-
-    def _handle_stderr(self):
-        if data := self._process.readAllStandardError().data().decode():
-            self.processOutput.emit("", data, self._current_task_type)
+        l.debug(
+            f"QProcess State Change: {event} - Task {task.task_id} "
+            f"({task.task_type}) - State: {state_str} - "
+            f"{len(self._running)}/{self.max_workers} running, "
+            f"{len(self._queue)} queued"
+        )
+
+    @property
+    def running_count(self) -> int:
+        return len(self._running)
+
+    @property
+    def queued_count(self) -> int:
+        return len(self._queue)
+
+    @Slot(str, list, str, result=int)
+    def enqueue_process(
+        self,
+        command: str,
+        arguments: list[str],
+        task_type: str,
+        stdin: Optional[bytes] = None,
+    ) -> int:
+        """Add a process to the execution queue and return its task id.
+
+        stdin, if given, is fed to the process once it starts.
+        """
+        task = ProcessTask(next_task_id(), command, arguments, task_type, stdin)
+        self._queue.append(task)
+        self._log_process_state("enqueue_process", task)
+        self._start_timer.start(0)
+        return task.task_id
 
     @Slot()
-    def kill_current_process(self):
-        if self._process.state() == QProcess.Running:
-            self._process.kill()
+    def _start_pending_processes(self):
+        """Fill free worker slots from the queue."""
+        while self._queue and len(self._running) < self.max_workers:
+            self._start_process(self._queue.popleft())
+
+    def _start_process(self, task: ProcessTask):
+        process = QProcess(self)
+        task.process = process
+        self._running[task.task_id] = task
+
+        process.readyReadStandardOutput.connect(lambda: self._handle_stdout(task))
+        process.readyReadStandardError.connect(lambda: self._handle_stderr(task))
+        process.finished.connect(
+            lambda exit_code, exit_status: self._on_process_finished(
+                task, exit_code, exit_status
+            )
+        )
+        process.errorOccurred.connect(lambda error: self._handle_error(task, error))
+        start_in_own_session(process)
+
+        self._log_process_state("_start_process - Starting Process", task)
+        process.start(task.command, task.arguments)
+        if task.task_id in self._running:  # FailedToStart already cleaned up
+            if task.stdin is not None:
+                # Buffered by QProcess and written as the pipe drains
+                process.write(task.stdin)
+                process.closeWriteChannel()
+                task.stdin = None
+            pid = process.processId()
+            self.taskStarted.emit(task.task_id, pid)
+            self.processStarted.emit(pid, task.task_type)
+
+    def _release(self, task: ProcessTask):
+        """Free the worker slot held by task and start whatever is queued."""
+        if self._running.pop(task.task_id, None) is not None and task.process:
+            task.process.deleteLater()
+        self._start_pending_processes()
+
+    def _handle_stdout(self, task: ProcessTask, final: bool = False):
+        data = task.process.readAllStandardOutput().data()
+        if text := task.stdout_decoder.decode(data, final):
+            self.taskOutput.emit(task.task_id, text, "")
+            self.processOutput.emit(text, "", task.task_type)
+
+    def _handle_stderr(self, task: ProcessTask, final: bool = False):
+        data = task.process.readAllStandardError().data()
+        if text := task.stderr_decoder.decode(data, final):
+            self.taskOutput.emit(task.task_id, "", text)
+            self.processOutput.emit("", text, task.task_type)
+
+    def pid(self, task_id: int) -> Optional[int]:
+        """OS process id of a running task, or None if it is not running."""
+        if task := self._running.get(task_id):
+            return task.process.processId() or None
+        return None
+
+    @Slot(int)
+    def kill_task(self, task_id: int):
+        """Kill a running task's process group, or drop it from the queue if not yet started."""
+        if task := self._running.get(task_id):
+            if task.process.state() != QProcess.NotRunning:
+                kill_process_group(task.process)
+            return
+        for queued in list(self._queue):
+            if queued.task_id == task_id:
+                self._queue.remove(queued)
 
-    def _on_process_finished(self, exit_code: int, exit_status: QProcess.ExitStatus):
-        self._log_process_state("_on_process_finished - Process Finished")
-        self.processFinished.emit(exit_code, self._current_task_type)
-        self._start_next_process()
+    @Slot()
+    def kill_all_processes(self):
+        self._queue.clear()
+        for task in list(self._running.values()):
+            if task.process.state() != QProcess.NotRunning:
+                kill_process_group(task.process)
 
-    def _handle_error(self, error: QProcess.ProcessError):
-        self.processError.emit(str(error), self._current_task_type)
+    @Slot()
+    def shutdown(self):
+        """Kill every process without reporting results, e.g. on application exit."""
+        self._queue.clear()
+        for task in list(self._running.values()):
+            task.process.blockSignals(True)
+            if task.process.state() != QProcess.NotRunning:
+                kill_process_group(task.process)
+                task.process.waitForFinished(1000)
+        self._running.clear()
+
+    def _on_process_finished(
+        self, task: ProcessTask, exit_code: int, exit_status: QProcess.ExitStatus
+    ):
+        self._log_process_state("_on_process_finished - Process Finished", task)
+        self._handle_stdout(task, final=True)
+        self._handle_stderr(task, final=True)
+        self.taskFinished.emit(task.task_id, signed_exit_code(exit_code, exit_status))
+        self.processFinished.emit(exit_code, task.task_type)
+        self._release(task)
+
+    def _handle_error(self, task: ProcessTask, error: QProcess.ProcessError):
+        self.processError.emit(str(error), task.task_type)
+        # A process that never started will not emit finished; for any other
+        # error finished follows and reports how the task ended
+        if error == QProcess.ProcessError.FailedToStart:
+            self.taskError.emit(task.task_id, str(error))
+            self._release(task)
+        else:
+            l.debug(f"Task {task.task_id} ({task.task_type}): {error}")
@@ -0,0 +1,68 @@
+import os
+import shlex
+import signal
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from qBarliman.constants import (
+    PROCESS_TIMEOUT_MS,
+    SCHEME_CPU_LIMIT_S,
+    SCHEME_MEMORY_LIMIT_MB,
+)
+from qBarliman.models.task_result import TaskStatus
+
+# Chez Scheme's message when an allocation fails
+_OUT_OF_MEMORY = "out of memory"
+
+
+@dataclass
+class ResourceLimits:
+    """Limits applied to each Scheme child process; 0 disables a limit.
+
+    CPU and memory are set as soft rlimits by a `sh -c ulimit` wrapper, so a
+    child over its CPU budget dies of SIGXCPU and one over its address space
+    fails to allocate, which tells them apart from our own SIGKILL. The
+    wall-clock timeout is enforced by the caller.
+    """
+
+    timeout_ms: int = PROCESS_TIMEOUT_MS
+    cpu_seconds: int = SCHEME_CPU_LIMIT_S
+    memory_mb: int = SCHEME_MEMORY_LIMIT_MB
+
+    def _ulimits(self) -> List[str]:
+        if os.name != "posix":
+            return []
+        ulimits = []
+        if self.cpu_seconds > 0:
+            ulimits.append(f"ulimit -S -t {self.cpu_seconds}")
+        if self.memory_mb > 0:
+            ulimits.append(f"ulimit -S -v {self.memory_mb * 1024}")
+        return ulimits
+
+    def wrap(self, command: str, arguments: List[str]) -> Tuple[str, List[str]]:
+        """Command and arguments that run command under the rlimits."""
+        if not (ulimits := self._ulimits()):
+            return command, arguments
+        script = "; ".join(ulimits) + '; exec "$@"'
+        return "/bin/sh", ["-c", script, "sh", command, *arguments]
+
+    def exceeded(self, exit_code: int, stderr: str) -> Optional[TaskStatus]:
+        """The limit a finished child hit, if any.
+
+        exit_code follows the runners' convention: minus the signal number
+        for a child killed by a signal.
+        """
+        if exit_code == -getattr(signal, "SIGXCPU", 0) and self.cpu_seconds > 0:
+            return TaskStatus.CPU_LIMIT
+        # A SIGKILL alone may come from the user, the OS or a cancelled race,
+        # so only Chez's own message counts as running out of memory
+        if exit_code != 0 and _OUT_OF_MEMORY in stderr.lower():
+            return TaskStatus.OOM
+        return None
+
+    def describe(self, status: TaskStatus) -> str:
+        if status == TaskStatus.TIMEOUT:
+            return f"Timed out after {self.timeout_ms / 1000:g}s"
+        if status == TaskStatus.CPU_LIMIT:
+            return f"CPU limit of {self.cpu_seconds}s exceeded"
+        return "Out of memory"
@@ -0,0 +1,132 @@
+import collections
+import hashlib
+import json
+import os
+from dataclasses import asdict, replace
+from typing import Optional
+
+from qBarliman.models.task_result import TaskResult, TaskStatus
+from qBarliman.utils import log as l
+
+# Results that depend only on the query text and are safe to replay
+CACHEABLE_STATUSES = {
+    TaskStatus.SUCCESS,
+    TaskStatus.PARSE_ERROR,
+    TaskStatus.SYNTAX_ERROR,
+    TaskStatus.EVALUATION_FAILED,
+    TaskStatus.FAILED,
+}
+
+
+def result_cache_key(query: str, interpreter_hash: str) -> str:
+    digest = hashlib.sha256(interpreter_hash.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(query.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed TaskResult cache: an in-memory LRU backed by an
+    optional on-disk tier, each bounded in size."""
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir if max_disk_bytes > 0 else None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "collections.OrderedDict[str, TaskResult]" = (
+            collections.OrderedDict()
+        )
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[TaskResult]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return replace(self._memory[key])
+        if result := self._disk_get(key):
+            self._memory_put(key, result)
+            return replace(result)
+        return None
+
+    def put(self, key: str, result: TaskResult) -> None:
+        if result.status not in CACHEABLE_STATUSES:
+            return
+        result = replace(result)
+        self._memory_put(key, result)
+        self._disk_put(key, result)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                os.remove(os.path.join(self.disk_dir, name))
+
+    def _memory_put(self, key: str, result: TaskResult):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[TaskResult]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # Keep recently used entries from eviction
+            data["status"] = TaskStatus[data["status"]]
+            return TaskResult(**data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            l.warn(f"Dropping unreadable cached result {path}: {e}")
+            self._remove(path)
+            return None
+
+    def _disk_put(self, key: str, result: TaskResult):
+        if not self.disk_dir:
+            return
+        data = asdict(result)
+        data["status"] = result.status.name
+        path = self._disk_path(key)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            l.warn(f"Could not write cached result {path}: {e}")
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove least recently used entries until the tier fits its budget."""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
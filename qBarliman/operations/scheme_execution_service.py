@@ -1,68 +1,297 @@
 import os
+import signal
 import time
-from dataclasses import dataclass
-from enum import Enum, auto
-from typing import Optional
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Union
 
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, QTimer, Signal
 
-from qBarliman.constants import SCHEME_EXECUTABLE
-from qBarliman.operations.process_manager import ProcessManager
+from qBarliman.constants import (
+    BARLIMAN_STDIN_FULLPATH,
+    CORE_FULLPATH,
+    PROFILED_FULLPATH,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_DISK_BYTES,
+    RESULT_CACHE_ENTRIES,
+    SEARCH_PROFILE,
+    WARM_WORKERS,
+    scheme_executable,
+)
+from qBarliman.models.task_result import TaskResult, TaskStatus
+from qBarliman.operations.process_manager import ProcessManager, next_task_id
+from qBarliman.operations.resource_limits import ResourceLimits
+from qBarliman.operations.result_cache import ResultCache, result_cache_key
+from qBarliman.operations.scheme_worker_pool import SchemeWorkerPool
+from qBarliman.operations.search_profile import ProfileSplitter
 from qBarliman.utils import log as l
+from qBarliman.utils.interpreter_cache import interpreter_build, interpreter_hash
+from qBarliman.utils.sexp import SexpFramer
+from qBarliman.utils.tracing import tracer
 
 
-class TaskStatus(Enum):
-    SUCCESS = auto()
-    PARSE_ERROR = auto()
-    SYNTAX_ERROR = auto()
-    EVALUATION_FAILED = auto()
-    THINKING = auto()
-    FAILED = auto()
-    TERMINATED = auto()
+def is_success(result: TaskResult) -> bool:
+    return result.status == TaskStatus.SUCCESS
+
+
+def has_answer(result: TaskResult) -> bool:
+    """A success that printed an answer, rather than () or nothing."""
+    return is_success(result) and result.output.strip() not in ("", "()")
+
+
+@dataclass
+class RaceEntrant:
+    """One of several queries racing to answer the same task."""
+
+    variant: str  # recorded in the result if this entrant wins
+    query: str
+    conclusive: Callable[[TaskResult], bool] = is_success
+
+
+@dataclass
+class _Race:
+    race_id: int
+    task_type: str
+    start_time: float
+    entrants: Dict[int, RaceEntrant] = field(default_factory=dict)  # by task id
+    timeout_ms: int = 0  # per entrant once running, 0 uses the service's limit
 
 
 @dataclass
-class TaskResult:
+class _RunningTask:
+    """Per-task bookkeeping for a process owned by the ProcessManager."""
+
     task_type: str
-    status: TaskStatus
-    message: str
-    output: str = ""
-    elapsed_time: Optional[float] = None
+    start_time: float  # when queued, then when started
+    runner: Union[ProcessManager, SchemeWorkerPool]
+    cache_key: Optional[str] = None
+    race: Optional[_Race] = None
+    query_chars: int = 0
+    pid: Optional[int] = None
+    started: bool = False
+    first_output_time: Optional[float] = None
+    timer: Optional[QTimer] = None  # wall-clock limit, armed once running
+    stdout_chunks: List[str] = field(default_factory=list)
+    stderr_chunks: List[str] = field(default_factory=list)
+    framer: SexpFramer = field(default_factory=SexpFramer)
+    profile: ProfileSplitter = field(default_factory=ProfileSplitter)
+
+    @property
+    def stdout(self) -> str:
+        return "".join(self.stdout_chunks)
+
+    @property
+    def stderr(self) -> str:
+        return "".join(self.stderr_chunks)
 
 
 class SchemeExecutionService(QObject):
     """Service for executing Scheme code."""
 
     taskResultReady = Signal(TaskResult)
+    # Each complete s-expression a task prints, as soon as it is printed
+    partialResultReady = Signal(TaskResult)
     processStarted = Signal(str)
 
-    def __init__(self, parent: QObject = None):
+    def __init__(
+        self,
+        parent: QObject = None,
+        max_workers: Optional[int] = None,
+        warm_workers: int = WARM_WORKERS,
+        result_cache: Optional[ResultCache] = None,
+        limits: Optional[ResourceLimits] = None,
+        search_profile: bool = SEARCH_PROFILE,
+    ):
+        """search_profile gives warm workers the instrumented interpreter that
+        profiled queries need."""
         super().__init__(parent)
-        self.process_manager = ProcessManager()
-        self._task_type = ""
-        self.start_time = 0
-        self._current_process_id = None
-        self._stdout_buffer = ""
-        self._stderr_buffer = ""
-
-        self.process_manager.processOutput.connect(self._handle_output)
-        self.process_manager.processFinished.connect(self._handle_finished)
-        self.process_manager.processError.connect(self._handle_error)
-
-    def execute_scheme(self, script_path: str, task_type: str):
-        """Execute a Scheme script."""
+        self.limits = limits or ResourceLimits()
+        self.result_cache = result_cache or ResultCache(
+            RESULT_CACHE_ENTRIES, RESULT_CACHE_DIR, RESULT_CACHE_DISK_BYTES
+        )
+        try:
+            self._interpreter_hash = interpreter_hash()
+        except OSError as e:
+            l.warn(f"Could not hash interpreter sources: {e}")
+            self._interpreter_hash = ""
+        self.process_manager = ProcessManager(max_workers=max_workers)
+        paths = PROFILED_FULLPATH if search_profile else CORE_FULLPATH
+        build = interpreter_build(paths)
+        self.worker_pool = (
+            SchemeWorkerPool(
+                warm_workers,
+                load_paths=[build.so_path] if build.so_path else paths,
+                limits=self.limits,
+            )
+            if warm_workers > 0
+            else None
+        )
+        if self.worker_pool and not build.done:
+            # Workers start on the sources and move over once it is compiled
+            build.finished.connect(self._use_compiled_interpreter)
+        self._tasks: Dict[int, _RunningTask] = {}
+        self._races: Dict[int, _Race] = {}
+
+        for runner in filter(None, (self.process_manager, self.worker_pool)):
+            runner.taskStarted.connect(self._handle_started)
+            runner.taskOutput.connect(self._handle_output)
+            runner.taskFinished.connect(self._handle_finished)
+            runner.taskError.connect(self._handle_error)
+
+    def _use_compiled_interpreter(self, so_path: str):
+        if so_path and self.worker_pool:
+            self.worker_pool.reload([so_path])
+
+    @property
+    def uses_warm_workers(self) -> bool:
+        """True if queries should be built without the interpreter prelude."""
+        return self.worker_pool is not None
+
+    def _replay_cached(self, cache_key: Optional[str], task_type: str) -> bool:
+        """Emit a cached result for this query, if there is one."""
+        if cache_key is None:
+            return False
+        if (result := self.result_cache.get(cache_key)) is None:
+            return False
+        l.good(f"Cached result for {task_type}: {result.message}")
+        tracer.instant("cache hit", task_type, status=result.status.name)
+        self.taskResultReady.emit(replace(result, task_type=task_type))
+        return True
+
+    def execute_scheme(
+        self, script_path: str, task_type: str, query: Optional[str] = None
+    ) -> Optional[int]:
+        """Execute a Scheme script; query is the script text, used for result caching.
+
+        Returns a task id for cancel_task, or None if the result was reported
+        immediately (cached or failed to launch).
+        """
+        cache_key = self._cache_key(query)
+        if self._replay_cached(cache_key, task_type):
+            return None
         l.good(f"Execute: scheme --script {script_path}")
         if not os.path.exists(script_path):
             return self._handle_execution_error(task_type, "Script file not found.")
-        if not SCHEME_EXECUTABLE:
+        if not scheme_executable():
+            return self._handle_execution_error(task_type, "SCHEME_EXECUTABLE not set.")
+        self.processStarted.emit(task_type)
+        return self._enqueue_script(script_path, task_type, cache_key)
+
+    def execute_source(self, query: str, task_type: str) -> Optional[int]:
+        """Execute a complete Scheme program, fed to the process over stdin.
+
+        Nothing is written to disk. Returns a task id like execute_scheme.
+        """
+        cache_key = self._cache_key(query)
+        if self._replay_cached(cache_key, task_type):
+            return None
+        if not scheme_executable():
             return self._handle_execution_error(task_type, "SCHEME_EXECUTABLE not set.")
-        self._task_type = task_type
-        self.start_time = time.monotonic()
+        l.good(f"Execute: scheme --script {BARLIMAN_STDIN_FULLPATH} < {task_type}")
         self.processStarted.emit(task_type)
+        return self._enqueue_source(query, task_type, cache_key)
+
+    def _enqueue_script(self, script_path: str, task_type: str, cache_key) -> int:
+        return self._enqueue_process(["--script", script_path], task_type, cache_key)
+
+    def _enqueue_source(self, query: str, task_type: str, cache_key, race=None) -> int:
+        return self._enqueue_process(
+            ["--script", BARLIMAN_STDIN_FULLPATH],
+            task_type,
+            cache_key,
+            race,
+            stdin=query.encode("utf-8"),
+        )
 
-        self.process_manager.enqueue_process(
-            SCHEME_EXECUTABLE, ["--script", script_path], task_type
+    def _enqueue_process(
+        self, arguments: List[str], task_type: str, cache_key, race=None, stdin=None
+    ) -> int:
+        task_id = self.process_manager.enqueue_process(
+            *self.limits.wrap(scheme_executable(), arguments), task_type, stdin
         )
+        self._tasks[task_id] = _RunningTask(
+            task_type,
+            time.monotonic(),
+            self.process_manager,
+            cache_key,
+            race,
+            len(stdin) if stdin else 0,
+        )
+        return task_id
+
+    def _enqueue_query(self, query: str, task_type: str, cache_key, race=None) -> int:
+        task_id = self.worker_pool.enqueue_query(query, task_type)
+        self._tasks[task_id] = _RunningTask(
+            task_type, time.monotonic(), self.worker_pool, cache_key, race, len(query)
+        )
+        return task_id
+
+    def _cache_key(self, query: Optional[str]) -> Optional[str]:
+        if query is None:
+            return None
+        return result_cache_key(query, self._interpreter_hash)
+
+    def execute_query(self, query: str, task_type: str) -> Optional[int]:
+        """Execute a prelude-free query on a warm worker; returns a task id like execute_scheme."""
+        if self.worker_pool is None:
+            return self._handle_execution_error(task_type, "Warm workers disabled.")
+        cache_key = self._cache_key(query)
+        if self._replay_cached(cache_key, task_type):
+            return None
+        l.good(f"Execute on warm worker: {task_type}")
+        self.processStarted.emit(task_type)
+        return self._enqueue_query(query, task_type, cache_key)
+
+    def execute_race(
+        self, entrants: List[RaceEntrant], task_type: str, timeout_ms: int = 0
+    ) -> Optional[int]:
+        """Run entrants side by side and report the first conclusive result.
+
+        Entrants are queued in order, so earlier ones get worker slots first.
+        The remaining entrants are killed as soon as one is conclusive; if
+        none is, the last one to finish is reported. timeout_ms limits each
+        entrant's wall-clock time, so one that runs on frees its slot for the
+        next. Returns an id for cancel_task, or None if the race was settled
+        from the result cache.
+        """
+        race = _Race(next_task_id(), task_type, time.monotonic(), timeout_ms=timeout_ms)
+        fallback = TaskResult(task_type, TaskStatus.FAILED, "Nothing to race")
+        to_run = []
+        for entrant in entrants:
+            cache_key = self._cache_key(entrant.query)
+            if (cached := self.result_cache.get(cache_key)) is None:
+                to_run.append((entrant, cache_key))
+                continue
+            cached = replace(cached, task_type=task_type, variant=entrant.variant)
+            if entrant.conclusive(cached):
+                l.good(f"Cached {entrant.variant} result for {task_type}")
+                self.taskResultReady.emit(cached)
+                return None
+            fallback = cached
+        if not to_run:
+            self.taskResultReady.emit(fallback)
+            return None
+        if not scheme_executable():
+            return self._handle_execution_error(task_type, "SCHEME_EXECUTABLE not set.")
+
+        l.good(f"Racing {', '.join(e.variant for e, _ in to_run)} for {task_type}")
+        self.processStarted.emit(task_type)
+        for entrant, cache_key in to_run:
+            if self.worker_pool is not None:
+                task_id = self._enqueue_query(entrant.query, task_type, cache_key, race)
+            else:
+                task_id = self._enqueue_source(entrant.query, task_type, cache_key, race)
+            race.entrants[task_id] = entrant
+        self._races[race.race_id] = race
+        return race.race_id
+
+    def _end_race(self, race: _Race):
+        """Forget a race and kill its remaining entrants without reporting them."""
+        self._races.pop(race.race_id, None)
+        for task_id in list(race.entrants):
+            if task := self._pop_task(task_id):
+                task.runner.kill_task(task_id)
+                self._trace_exit(task_id, task, TaskStatus.TERMINATED.name)
+        race.entrants.clear()
 
     # TODO Rename this here and in `execute_scheme`
     def _handle_execution_error(self, task_type, arg1):
@@ -70,46 +299,177 @@ class SchemeExecutionService(QObject):
         self.taskResultReady.emit(result)
         return None
 
-    def kill_process(self, pid=None):
-        l.debug(f"Kill process, pid={pid}")
-        if pid is not None:
-            try:
-                os.kill(pid, 15)  # SIGTERM
-                self._current_process_id = None  # Clear the ID
-            except ProcessLookupError:
-                l.warn(f"Process with PID {pid} not found.")
-            except OSError as e:  # more general, catch permission errors etc
-                l.warn(f"Error killing process {pid}: {e}")
-        # No else case
-
-    def _handle_output(self, stdout: str, stderr: str):
-        """Accumulate output from process."""
-        if stdout:
-            self._stdout_buffer += stdout
+    def pid(self, task_id: int) -> Optional[int]:
+        """OS process id running task_id, or None if it is queued or done."""
+        task = self._tasks.get(task_id)
+        return task.pid if task else None
+
+    def _pop_task(self, task_id: int) -> Optional[_RunningTask]:
+        """Stop tracking task_id; later signals for it are ignored."""
+        if (task := self._tasks.pop(task_id, None)) and task.timer:
+            task.timer.stop()
+            task.timer.deleteLater()
+        return task
+
+    def _trace(
+        self, task_id: int, task: _RunningTask, name: str, start: float, **args
+    ):
+        """Record a span of task's lifecycle, labelled with its race variant."""
+        if task.race and (entrant := task.race.entrants.get(task_id)):
+            args["variant"] = entrant.variant
+        tracer.add(name, task.task_type, start, task_id=task_id, **args)
+
+    def _trace_exit(self, task_id: int, task: _RunningTask, status: str):
+        """Record the span from a task's start, or queuing, to its end."""
+        stdout = sum(map(len, task.stdout_chunks))
+        stderr = sum(map(len, task.stderr_chunks))
+        name = "process" if task.started else "queue"
+        self._trace(
+            task_id,
+            task,
+            name,
+            task.start_time,
+            status=status,
+            stdout_chars=stdout,
+            stderr_chars=stderr,
+        )
+
+    def cancel_task(self, task_id: Optional[int]):
+        """Stop a queued or running task and report it as TERMINATED.
+
+        Running tasks are killed along with their whole process group. Any
+        output the task still produces afterwards is discarded.
+        """
+        if race := self._races.get(task_id):
+            self._end_race(race)
+            result = TaskResult(race.task_type, TaskStatus.TERMINATED, "Terminated")
+            result.elapsed_time = time.monotonic() - race.start_time
+            self.taskResultReady.emit(result)
+        elif task_id is not None:
+            self._terminate(task_id, TaskStatus.TERMINATED, "Terminated")
+
+    def _terminate(self, task_id: int, status: TaskStatus, message: str):
+        if not (task := self._pop_task(task_id)):
+            return
+        l.debug(f"Stop task {task_id} ({task.task_type}), pid={task.pid}: {message}")
+        task.runner.kill_task(task_id)
+        self._trace_exit(task_id, task, status.name)
+        result = TaskResult(task.task_type, status, message, task.stdout)
+        result.elapsed_time = time.monotonic() - task.start_time
+        result.profile = task.profile.latest
+        self._report(task_id, task, result)
+
+    def cancel_all(self):
+        for task_id in [*self._races, *self._tasks]:
+            self.cancel_task(task_id)
+
+    def _report(self, task_id: int, task: _RunningTask, result: TaskResult):
+        """Emit a finished task's result, or settle the race it is part of."""
+        if (race := task.race) is None:
+            self.taskResultReady.emit(result)
+            return
+        entrant = race.entrants.pop(task_id)
+        result.variant = entrant.variant
+        if entrant.conclusive(result) or not race.entrants:
+            l.good(f"{entrant.variant} settled {race.task_type}: {result.message}")
+            self._end_race(race)
+            result.elapsed_time = time.monotonic() - race.start_time
+            self.taskResultReady.emit(result)
+        else:
+            l.debug(f"{entrant.variant} inconclusive for {race.task_type}")
+
+    def _handle_started(self, task_id: int, pid: int):
+        """Restart the clock once a queued task gets a worker slot."""
+        if task := self._tasks.get(task_id):
+            self._trace(
+                task_id, task, "queue", task.start_time, query_chars=task.query_chars
+            )
+            task.start_time = time.monotonic()
+            task.started = True
+            task.pid = pid
+            if (limits := self._limits(task)).timeout_ms > 0:
+                task.timer = QTimer(self)
+                task.timer.setSingleShot(True)
+                task.timer.timeout.connect(lambda: self._handle_timeout(task_id))
+                task.timer.start(limits.timeout_ms)
+            l.debug(f"Task {task_id} ({task.task_type}) started, pid={pid}")
+
+    def _handle_output(self, task_id: int, stdout: str, stderr: str):
+        """Accumulate output from process, reporting each datum it completes."""
+        if not (task := self._tasks.get(task_id)):
+            return
         if stderr:
-            self._stderr_buffer += stderr
-        l.debug(f"Process output - stdout: {stdout}, stderr: {stderr}")
+            task.stderr_chunks.append(stderr)
+        stdout = task.profile.feed(stdout)
+        if stdout:
+            if task.first_output_time is None and stdout.strip():
+                task.first_output_time = time.monotonic()
+                self._trace(task_id, task, "first output", task.start_time)
+            task.stdout_chunks.append(stdout)
+            for datum in task.framer.feed(stdout):
+                self._emit_partial(task, datum)
+        l.debug(
+            "Process output (%s) - stdout: %s, stderr: %s", task.task_type, stdout, stderr
+        )
 
-    def _handle_error(self, error: str):
-        result = TaskResult(self._task_type, TaskStatus.FAILED, error)
-        self.taskResultReady.emit(result)
+    def _emit_partial(self, task: _RunningTask, datum: str):
+        status = TaskStatus.THINKING
+        result = TaskResult(task.task_type, status, "Partial result", datum)
+        result.elapsed_time = time.monotonic() - task.start_time
+        self.partialResultReady.emit(result)
 
-    def _handle_finished(self, exit_code: int):
-        elapsed_time = time.monotonic() - self.start_time
+    def _limits(self, task: _RunningTask) -> ResourceLimits:
+        """The limits task runs under: a race may set its own timeout."""
+        if task.race and task.race.timeout_ms:
+            return replace(self.limits, timeout_ms=task.race.timeout_ms)
+        return self.limits
 
-        l.debug(f"Process finished with exit code {exit_code}")
-        l.debug(f"Final stdout: {self._stdout_buffer}")
-        l.debug(f"Final stderr: {self._stderr_buffer}")
+    def _handle_timeout(self, task_id: int):
+        if not (task := self._tasks.get(task_id)):
+            return
+        message = self._limits(task).describe(TaskStatus.TIMEOUT)
+        self._terminate(task_id, TaskStatus.TIMEOUT, message)
 
-        result = self._process_output(self._stdout_buffer, self._task_type, exit_code)
-        result.elapsed_time = elapsed_time
-        result.output = self._stderr_buffer or result.output
+    def _handle_error(self, task_id: int, error: str):
+        if not (task := self._pop_task(task_id)):
+            return
+        self._trace_exit(task_id, task, TaskStatus.FAILED.name)
+        result = TaskResult(task.task_type, TaskStatus.FAILED, error)
+        self._report(task_id, task, result)
 
-        self._stdout_buffer = ""
-        self._stderr_buffer = ""
+    def _handle_finished(self, task_id: int, exit_code: int):
+        if not (task := self._pop_task(task_id)):
+            return
+        elapsed_time = time.monotonic() - task.start_time
 
-        self.taskResultReady.emit(result)
-        self._current_process_id = None
+        if rest := task.profile.flush():
+            task.stdout_chunks.append(rest)
+            for datum in task.framer.feed(rest):
+                self._emit_partial(task, datum)
+        if exit_code == 0:
+            for datum in task.framer.flush():
+                self._emit_partial(task, datum)
+        stdout, stderr = task.stdout, task.stderr
+
+        l.debug(f"Process {task.task_type} finished with exit code {exit_code}")
+        l.debug("Final stdout: %s", stdout)
+        l.debug("Final stderr: %s", stderr)
+
+        if limit := self.limits.exceeded(exit_code, stderr):
+            message = self.limits.describe(limit)
+            l.warn(f"{task.task_type}: {message}")
+            result = TaskResult(task.task_type, limit, message, stdout)
+        else:
+            result = self._process_output(stdout, task.task_type, exit_code)
+        result.elapsed_time = elapsed_time
+        result.profile = task.profile.latest
+        self._trace_exit(task_id, task, result.status.name)
+        result.output = stderr or result.output
+
+        # A non-zero exit may be a kill rather than an answer, so don't keep it
+        if task.cache_key is not None and exit_code == 0:
+            self.result_cache.put(task.cache_key, result)
+        self._report(task_id, task, result)
 
     def _process_output(
         self, output: str, task_type: str, exit_code: int = 0
@@ -117,7 +477,13 @@ class SchemeExecutionService(QObject):
         """Processes output, determines status, *and* sets the color."""
         output = output.strip()
 
-        if exit_code != 0:
+        if exit_code in (-signal.SIGKILL, -signal.SIGTERM):
+            status = TaskStatus.TERMINATED
+            message = "Killed"
+        elif exit_code < 0:
+            status = TaskStatus.FAILED
+            message = f"Crashed (signal {-exit_code})"
+        elif exit_code != 0:
             status = TaskStatus.SYNTAX_ERROR
             message = "Syntax Error"
         elif output == "parse-error-in-defn":
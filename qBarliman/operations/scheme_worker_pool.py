@@ -0,0 +1,290 @@
+import codecs
+import collections
+from dataclasses import dataclass, field, replace
+from typing import Deque, List, Optional
+
+from PySide6.QtCore import QCoreApplication, QObject, QProcess, QTimer, Signal, Slot
+
+from qBarliman.constants import (
+    BARLIMAN_WORKER_FULLPATH,
+    CORE_FULLPATH,
+    WORKER_MAX_RESPAWNS,
+    scheme_executable,
+)
+from qBarliman.operations.process_manager import (
+    kill_process_group,
+    next_task_id,
+    signed_exit_code,
+    start_in_own_session,
+)
+from qBarliman.operations.resource_limits import ResourceLimits
+from qBarliman.utils import log as l
+
+RESULT_HEADER = "#qbarliman-result "
+
+
+@dataclass
+class QueryTask:
+    """A query waiting for, or being served by, a warm worker."""
+
+    task_id: int
+    query: str
+    task_type: str
+
+
+@dataclass
+class _Worker:
+    slot: int
+    process: QProcess
+    task: Optional[QueryTask] = None
+    stdout_buffer: str = ""
+    stderr_buffer: str = ""
+    crashes: int = 0
+    killed: bool = False
+    stale: bool = False  # loaded files the pool no longer uses
+    decoder: codecs.IncrementalDecoder = field(
+        default_factory=lambda: codecs.getincrementaldecoder("utf-8")("replace")
+    )
+    stderr_decoder: codecs.IncrementalDecoder = field(
+        default_factory=lambda: codecs.getincrementaldecoder("utf-8")("replace")
+    )
+
+
+class SchemeWorkerPool(QObject):
+    """Keeps warm Chez Scheme processes with miniKanren and the interpreter loaded.
+
+    Queries are sent to an idle worker over stdin using the framing protocol
+    described in barliman-worker.scm.  Workers that crash or are killed are
+    respawned. The task signals mirror ProcessManager's so both runners can
+    feed the same result handling.
+    """
+
+    taskStarted = Signal(int, int)  # task_id, PID
+    taskOutput = Signal(int, str, str)  # task_id, stdout, stderr
+    taskFinished = Signal(int, int)  # task_id, exit code or -signal if killed
+    taskError = Signal(int, str)  # task_id, error message
+
+    def __init__(
+        self,
+        worker_count: int,
+        parent=None,
+        load_paths: Optional[List[str]] = None,
+        limits: Optional[ResourceLimits] = None,
+    ):
+        super().__init__(parent)
+        self.load_paths = load_paths if load_paths is not None else CORE_FULLPATH
+        # RLIMIT_CPU would add up over every query a worker serves
+        self.limits = replace(limits or ResourceLimits(), cpu_seconds=0)
+        self._queue: Deque[QueryTask] = collections.deque()
+        self._workers: List[Optional[_Worker]] = [None] * max(1, worker_count)
+        self._shutting_down = False
+
+        for slot in range(len(self._workers)):
+            self._spawn_worker(slot)
+
+        if app := QCoreApplication.instance():
+            app.aboutToQuit.connect(self.shutdown)
+
+    @property
+    def worker_count(self) -> int:
+        return len(self._workers)
+
+    def _spawn_worker(self, slot: int, crashes: int = 0):
+        if self._shutting_down:
+            return
+        process = QProcess(self)
+        worker = _Worker(slot, process, crashes=crashes)
+        self._workers[slot] = worker
+
+        process.readyReadStandardOutput.connect(lambda: self._handle_stdout(worker))
+        process.readyReadStandardError.connect(lambda: self._handle_stderr(worker))
+        process.finished.connect(
+            lambda exit_code, exit_status: self._on_worker_finished(
+                worker, exit_code, exit_status
+            )
+        )
+        process.errorOccurred.connect(lambda error: self._handle_error(worker, error))
+        start_in_own_session(process)
+
+        l.debug(f"Spawning warm Scheme worker {slot}")
+        process.start(
+            *self.limits.wrap(
+                scheme_executable(),
+                ["--script", BARLIMAN_WORKER_FULLPATH, *self.load_paths],
+            )
+        )
+        self._dispatch()
+
+    @Slot(str, str, result=int)
+    def enqueue_query(self, query: str, task_type: str) -> int:
+        """Queue a query (without interpreter prelude) and return its task id."""
+        task = QueryTask(next_task_id(), query, task_type)
+        self._queue.append(task)
+        QTimer.singleShot(0, self._dispatch)
+        return task.task_id
+
+    def _idle_workers(self):
+        return [
+            w
+            for w in self._workers
+            if w is not None
+            and w.task is None
+            and not w.stale
+            and w.process.state() != QProcess.NotRunning
+        ]
+
+    @Slot()
+    def _dispatch(self):
+        for worker in self._idle_workers():
+            if not self._queue:
+                return
+            self._send(worker, self._queue.popleft())
+
+    def _send(self, worker: _Worker, task: QueryTask):
+        worker.task = task
+        worker.stderr_buffer = ""
+        payload = task.query.replace("\r\n", "\n")
+        worker.process.write(f"{len(payload)}\n{payload}".encode("utf-8"))
+        l.debug(f"Worker {worker.slot} serving task {task.task_id} ({task.task_type})")
+        self.taskStarted.emit(task.task_id, worker.process.processId())
+
+    def _handle_stdout(self, worker: _Worker):
+        data = worker.process.readAllStandardOutput().data()
+        worker.stdout_buffer += worker.decoder.decode(data)
+        while self._take_response(worker):
+            pass
+
+    def _take_response(self, worker: _Worker) -> bool:
+        """Complete the worker's task if a whole response frame is buffered."""
+        buffer = worker.stdout_buffer
+        start = buffer.find(RESULT_HEADER)
+        if start < 0:
+            return False
+        end_of_header = buffer.find("\n", start)
+        if end_of_header < 0:
+            return False
+        if start > 0:
+            l.debug(f"Worker {worker.slot} stray output: {buffer[:start]}")
+        status, length = buffer[start + len(RESULT_HEADER) : end_of_header].split()
+        body_start = end_of_header + 1
+        body_end = body_start + int(length)
+        if len(buffer) < body_end:
+            return False
+
+        body = buffer[body_start:body_end]
+        worker.stdout_buffer = buffer[body_end:]
+        worker.crashes = 0
+        task, worker.task = worker.task, None
+        if worker.stale:
+            self._retire(worker)
+        if task is not None:
+            if status == "ok":
+                self.taskOutput.emit(task.task_id, body, "")
+                self.taskFinished.emit(task.task_id, 0)
+            else:
+                self.taskOutput.emit(task.task_id, "", body)
+                self.taskFinished.emit(task.task_id, 1)
+        self._dispatch()
+        return True
+
+    def _handle_stderr(self, worker: _Worker):
+        data = worker.process.readAllStandardError().data()
+        data = worker.stderr_decoder.decode(data)
+        worker.stderr_buffer += data
+        l.debug(f"Worker {worker.slot} stderr: {data}")
+
+    def _finish_in_flight(self, worker: _Worker, exit_code: int):
+        if task := worker.task:
+            worker.task = None
+            self.taskOutput.emit(task.task_id, "", worker.stderr_buffer)
+            self.taskFinished.emit(task.task_id, exit_code or 1)
+
+    def _on_worker_finished(
+        self, worker: _Worker, exit_code: int, exit_status: QProcess.ExitStatus
+    ):
+        exit_code = signed_exit_code(exit_code, exit_status)
+        l.debug(f"Worker {worker.slot} exited with code {exit_code}")
+        self._finish_in_flight(worker, exit_code)
+        self._respawn(worker)
+
+    def _handle_error(self, worker: _Worker, error: QProcess.ProcessError):
+        # A process that never started will not emit finished
+        if error == QProcess.ProcessError.FailedToStart:
+            if task := worker.task:
+                worker.task = None
+                self.taskError.emit(task.task_id, str(error))
+            self._respawn(worker)
+
+    def _respawn(self, worker: _Worker):
+        if self._shutting_down or self._workers[worker.slot] is not worker:
+            return
+        worker.process.deleteLater()
+        self._workers[worker.slot] = None
+        crashes = 0 if worker.killed else worker.crashes + 1
+        if crashes > WORKER_MAX_RESPAWNS:
+            l.warn(f"Warm Scheme worker {worker.slot} keeps crashing, giving up")
+            self._fail_queue_if_no_workers()
+            return
+        self._spawn_worker(worker.slot, crashes)
+
+    def _fail_queue_if_no_workers(self):
+        if any(w is not None for w in self._workers):
+            return
+        while self._queue:
+            task = self._queue.popleft()
+            self.taskError.emit(task.task_id, "No warm Scheme worker available")
+
+    def reload(self, load_paths: List[str]):
+        """Respawn every worker with load_paths, each once its task is done."""
+        self.load_paths = load_paths
+        for worker in self._workers:
+            if worker is not None:
+                worker.stale = True
+                if worker.task is None:
+                    self._retire(worker)
+
+    def _retire(self, worker: _Worker):
+        # Killed rather than crashed, so it is respawned without counting
+        worker.killed = True
+        kill_process_group(worker.process)
+
+    def pid(self, task_id: int) -> Optional[int]:
+        """OS process id of the worker serving task_id, or None if it is not being served."""
+        for worker in self._workers:
+            if worker and worker.task and worker.task.task_id == task_id:
+                return worker.process.processId() or None
+        return None
+
+    @Slot(int)
+    def kill_task(self, task_id: int):
+        """Kill the worker serving task_id (it is respawned), or drop it from the queue."""
+        for worker in self._workers:
+            if worker and worker.task and worker.task.task_id == task_id:
+                worker.killed = True
+                kill_process_group(worker.process)
+                return
+        for queued in list(self._queue):
+            if queued.task_id == task_id:
+                self._queue.remove(queued)
+
+    @Slot()
+    def kill_all_processes(self):
+        self._queue.clear()
+        for worker in self._workers:
+            if worker and worker.task:
+                worker.killed = True
+                kill_process_group(worker.process)
+
+    @Slot()
+    def shutdown(self):
+        """Stop every worker without respawning, e.g. on application exit."""
+        self._shutting_down = True
+        self._queue.clear()
+        for worker in self._workers:
+            if worker is None:
+                continue
+            worker.process.blockSignals(True)
+            if worker.process.state() != QProcess.NotRunning:
+                kill_process_group(worker.process)
+                worker.process.waitForFinished(1000)
+        self._workers = [None] * len(self._workers)
@@ -0,0 +1,116 @@
+"""
+Counts reported by the Scheme-side search profiler (search-profile-* in
+templates/barliman-search-profile.scm). A profiled query prints them among
+its output as lines of
+
+    #qbarliman-profile ((== tried failed) (depth-limit cut)
+                        (label entered produced max-depth subst-total store-total) ...)
+
+where each label is an eval-clause of eval-expo in rel-interp/interp.scm.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+from qBarliman.utils.sexp import ATOM, LIST, SexpSyntaxError, read_all
+
+PROFILE_MARKER = "#qbarliman-profile "
+
+
+class ProfileSplitter:
+    """Removes profile lines from a stream of output, keeping the latest.
+
+    Text is fed in arbitrary chunks. A line is held back only while it could
+    still turn out to be a profile line, so other output is not delayed.
+    """
+
+    def __init__(self):
+        self.latest = ""  # profile datum of the last complete profile line
+        self._held = ""
+        self._at_line_start = True
+
+    def feed(self, text: str) -> str:
+        """Add text and return it without profile lines."""
+        text = self._held + text
+        self._held = ""
+        out = []
+        pos = 0
+        while pos < len(text):
+            end = text.find("\n", pos)
+            segment = text[pos:] if end < 0 else text[pos : end + 1]
+            pos += len(segment)
+            if self._at_line_start and end < 0 and (
+                segment.startswith(PROFILE_MARKER) or PROFILE_MARKER.startswith(segment)
+            ):
+                self._held = segment
+                break
+            if self._at_line_start and segment.startswith(PROFILE_MARKER):
+                self.latest = segment[len(PROFILE_MARKER) :].strip()
+                continue
+            out.append(segment)
+            self._at_line_start = end >= 0
+        return "".join(out)
+
+    def flush(self) -> str:
+        """End of stream: return held text, unless it is a cut-off profile line."""
+        held, self._held = self._held, ""
+        self._at_line_start = True
+        return "" if held.startswith(PROFILE_MARKER) else held
+
+
+@dataclass(frozen=True)
+class ClauseProfile:
+    label: str
+    entered: int
+    produced: int  # states the clause succeeded with
+    max_depth: int  # deepest conde nesting it was entered at
+    subst_total: int  # substitution sizes summed over entries
+    store_total: int  # constraint store sizes summed over entries
+
+
+@dataclass(frozen=True)
+class SearchProfile:
+    unifications: int
+    failed_unifications: int
+    depth_limit_cuts: int  # branches cut by max-search-depth
+    clauses: Tuple[ClauseProfile, ...]
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["SearchProfile"]:
+        """Profile from the datum of a profile line, or None if malformed."""
+        try:
+            (datum,) = read_all(text)
+            unifications = failed = cuts = 0
+            clauses = []
+            for entry in datum.children:
+                if entry.kind != LIST or any(c.kind != ATOM for c in entry.children):
+                    raise ValueError(f"Unexpected profile entry {entry}")
+                label, *counts = [c.text for c in entry.children]
+                if label == "==":
+                    unifications, failed = map(int, counts)
+                elif label == "depth-limit":
+                    (cuts,) = map(int, counts)
+                else:
+                    clauses.append(ClauseProfile(label, *map(int, counts)))
+        except (SexpSyntaxError, ValueError, TypeError):
+            return None
+        return cls(unifications, failed, cuts, tuple(clauses))
+
+    def summary(self, limit: int = 8) -> str:
+        """The limit clauses entered most often, one per line, after the totals."""
+        lines = [f"unifications: {self.unifications} ({self.failed_unifications} failed)"]
+        if self.depth_limit_cuts:
+            lines.append(f"cut at max-search-depth: {self.depth_limit_cuts}")
+        entered = sum(c.entered for c in self.clauses) or 1
+        busiest = sorted(self.clauses, key=lambda c: -c.entered)[:limit]
+        for c in busiest:
+            lines.append(
+                f"{c.label}: {c.entered} entered ({c.entered / entered:.0%}), "
+                f"{c.produced} produced, depth {c.max_depth}, "
+                f"subst {c.subst_total / max(c.entered, 1):.0f}, "
+                f"store {c.store_total / max(c.entered, 1):.0f}"
+            )
+        return "\n".join(lines)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
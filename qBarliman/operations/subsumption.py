@@ -0,0 +1,57 @@
+"""
+What one editor task's result decides about the others.
+
+The editor runs a simple query (can the definition be completed at all),
+one query per test, and allTests (one completion passing every test). An
+allTests answer passes the simple query and each test, and a definition
+that fails the simple query, or any test, fails allTests, so those tasks
+need not run to the end.
+"""
+
+from typing import Iterable, List
+
+from qBarliman.models.task_result import TaskResult, TaskStatus
+from qBarliman.operations.scheme_execution_service import has_answer
+
+# What Scheme reported about the query itself: the definition or a test does
+# not parse, or the search ran out without an answer. A limit, a kill or a
+# failure to start decides nothing about the other tasks.
+VERDICTS = frozenset({TaskStatus.PARSE_ERROR, TaskStatus.EVALUATION_FAILED})
+
+
+def is_verdict(result: TaskResult) -> bool:
+    return result.status in VERDICTS
+
+
+# (kind of the deciding task, whether its result decides, kinds of task
+# decided); a decided task gets the deciding result's status
+RULES = (
+    ("allTests", has_answer, ("simple", "test")),
+    ("simple", is_verdict, ("test", "allTests")),
+    ("test", is_verdict, ("allTests",)),
+)
+
+
+def task_kind(task_type: str) -> str:
+    return "test" if task_type.startswith("test") else task_type
+
+
+def implied_results(result: TaskResult, task_types: Iterable[str]) -> List[TaskResult]:
+    """Results that result implies for those of task_types it decides."""
+    kind = task_kind(result.task_type)
+    decided = {
+        decided_kind
+        for deciding, decides, kinds in RULES
+        if kind == deciding and decides(result)
+        for decided_kind in kinds
+    }
+    implied = []
+    for task_type in task_types:
+        if task_type == result.task_type or task_kind(task_type) not in decided:
+            continue
+        message = f"{result.message} ({result.task_type})"
+        implied_result = TaskResult(task_type, result.status, message)
+        implied_result.elapsed_time = result.elapsed_time
+        implied_result.implied_by = result.task_type
+        implied.append(implied_result)
+    return implied
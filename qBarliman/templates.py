@@ -1,15 +1,14 @@
+import functools
 from string import Template
+from typing import Callable, Dict, Iterable, List, Optional
 
+from qBarliman import constants
 from qBarliman.constants import (
-    ALLTESTS_STRING_1,
-    ALLTESTS_STRING_2,
     EVAL_FLAGS_COMPLETE,
     EVAL_FLAGS_FAST,
-    EVAL_STRING_1,
-    EVAL_STRING_2,
     EVAL_STRING_COMPLETE,
     EVAL_STRING_FAST,
-    INTERP_SCM,
+    LOAD_INTERP_CLAUSE_SCM,
     LOAD_MK_SCM,
     LOAD_MK_VICARE_SCM,
 )
@@ -19,8 +18,30 @@ from qBarliman.utils.rainbowp import rainbowp
 """
 Template definitions for query strings and other frequently used code.
 ref: https://docs.python.org/3/library/string.html#template-strings
+
+Templates built from the query string files are made on first access, by the
+module __getattr__ below, so importing this module reads no files.
 """
 
+_LAZY: Dict[str, Callable[[], object]] = {}
+
+
+def _lazy(name: str):
+    """Register a builder for the module attribute name, memoized."""
+
+    def register(build):
+        _LAZY[name] = functools.cache(build)
+        return _LAZY[name]
+
+    return register
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 ##### func makeQueryString
 ##### ARGS: $defns $body $expected_out $simple_query $name
 PARSE_ANS_STRING_T = Template(  # $name $defns $body
@@ -39,44 +60,58 @@ PARSE_WITH_FAKE_DEFNS_ANS_STRING_T = Template(  # $name $defns $body
 """
 )
 
-EVAL_STRING_T = Template(
-    f"""
-{EVAL_STRING_1}
+@_lazy("EVAL_STRING_T")
+def _eval_string_t() -> Template:
+    return Template(
+        f"""
+{constants.EVAL_STRING_1}
         (== `( $defns ) defn-list)
-{EVAL_STRING_2}
+{constants.EVAL_STRING_2}
   (evalo `(begin $defns $body) $expectedOut))))
 """
-)
+    )
 
-EVAL_STRING_FAST_T = Template(
-    f"""
-(begin {EVAL_FLAGS_FAST} {EVAL_STRING_T.safe_substitute()})
+
+@_lazy("EVAL_STRING_FAST_T")
+def _eval_string_fast_t() -> Template:
+    return Template(
+        f"""
+(begin {EVAL_FLAGS_FAST} {_eval_string_t().safe_substitute()})
 """
-)
+    )
 
-EVAL_STRING_COMPLETE_T = Template(
-    f"""
-(begin {EVAL_FLAGS_COMPLETE} {EVAL_STRING_T.safe_substitute()})
+
+@_lazy("EVAL_STRING_COMPLETE_T")
+def _eval_string_complete_t() -> Template:
+    return Template(
+        f"""
+(begin {EVAL_FLAGS_COMPLETE} {_eval_string_t().safe_substitute()})
 """
-)
+    )
 
-EVAL_STRING_BOTH_T = Template(
-    f"""
+
+@_lazy("EVAL_STRING_BOTH_T")
+def _eval_string_both_t() -> Template:
+    return Template(
+        f"""
 (let ((results-fast $eval_string_fast))
   (if (null? results-fast)
-    {EVAL_STRING_COMPLETE_T.safe_substitute()}
+    {_eval_string_complete_t().safe_substitute()}
     results-fast))
 """
-)
+    )
 
-DEFINE_ANS_STRING_T = Template(
-    f"""
+
+@_lazy("DEFINE_ANS_STRING_T")
+def _define_ans_string_t() -> Template:
+    return Template(
+        f"""
 (define (query-val$name)
   (if (null? (parse-ans$name))
       'parse-error
-      {EVAL_STRING_BOTH_T.safe_substitute()}))
+      {_eval_string_both_t().safe_substitute()}))
     """
-)
+    )
 
 # $defns $body $expected_out $query_type $name
 MAKE_QUERY_STRING_T = Template(  # $defns $body $expected_out $name
@@ -94,42 +129,64 @@ $define_ans
 )  # full_string
 ##########
 
-##### func makeAllTestsQueryString
-##### ARGS: $defns $body $expected_out $simple_query $name
+##### Interpreter prelude: loads miniKanren and the relational interpreter.
+##### Warm workers already have it loaded, so queries sent to them omit it.
+@_lazy("QUERY_PRELUDE")
+def _query_prelude() -> str:
+    return f"""
+{LOAD_MK_VICARE_SCM}
+{LOAD_MK_SCM}
+{LOAD_INTERP_CLAUSE_SCM}
+{constants.INTERP_SCM}
+"""
 
-ALL_TEST_WRITE_T = Template(
-    f"""
-;; allTests
-(define (ans-allTests)
-  (define (results)
-    {ALLTESTS_STRING_1}
-    (== `( $definitionText ) defn-list)
 
-    {ALLTESTS_STRING_2}
-        (== `( $definitionText ) defns) (appendo defns `(((lambda x x) $all_test_inputs)) begin-body) (evalo `(begin . ,begin-body) (list $all_test_outputs))))))
-(let ((results-fast {EVAL_STRING_FAST}))
-  (if (null? results-fast)
-    {EVAL_STRING_COMPLETE}
-    results-fast)))
-"""
-)  # return fullString
 ##########
 
 
+##### Calls thunk, or returns error-symbol if it raises an error
+TRY_SCM = """
+;; adapted from http://www.scheme.com/tspl4/exceptions.html
+(define (try thunk error-symbol)
+  (call/cc
+    (lambda (k)
+      (with-exception-handler
+        (lambda (x)
+          (if (error? x)
+              (k error-symbol)
+              (raise x)))
+        thunk))))
+"""
+
 ##### func makeQuerySimpleForMondoSchemeFileString
+##### The parse check: writes parse-error-in-defn or illegal-sexp-in-defn if
+##### parseo rejects the definition, or its answer if it parses.
 ##### ARGS: $defns  (inherited from MAKE_QUERY_STRING_T)
-MAKE_QUERY_SIMPLE_FOR_MONDO_SCHEME_T = Template(
+MAKE_QUERY_SIMPLE_T = Template(
     f"""
-{LOAD_MK_VICARE_SCM}
-{LOAD_MK_SCM}
-{INTERP_SCM}
 {MAKE_QUERY_STRING_T.safe_substitute(
     name="-simple",
     body=",_", expected_out="q", query_type="simple",
     parse_ans=PARSE_ANS_STRING_T.safe_substitute(),
     define_ans="")}
+{TRY_SCM}
+(write
+  (try
+    (lambda ()
+      (let ((vs (parse-ans-simple)))
+        (if (null? vs)
+            'parse-error-in-defn
+            vs)))
+    'illegal-sexp-in-defn))
+(newline)
 """
 )
+
+@_lazy("MAKE_QUERY_SIMPLE_FOR_MONDO_SCHEME_T")
+def _make_query_simple_for_mondo_scheme_t() -> Template:
+    return Template(_query_prelude() + MAKE_QUERY_SIMPLE_T.template)
+
+
 ##########
 
 
@@ -157,6 +214,40 @@ $new_test_query_template_string
 ##########
 
 
+##### Individual test query, self-contained: the query the mondo test files
+##### load, followed by barliman-new-test-query-template.scm's checks. Writes
+##### parse-error-in-defn, parse-error-in-test/answer, ... or the answers.
+##### ARGS: $n $defns $body $expectedOut
+@_lazy("MAKE_QUERY_TEST_T")
+def _make_query_test_t() -> Template:
+    return Template(
+        f"""
+;; individual test query
+{PARSE_ANS_STRING_T.safe_substitute(name="-simple", body=",_")}
+{PARSE_WITH_FAKE_DEFNS_ANS_STRING_T.safe_substitute(name="-test$n")}
+{_define_ans_string_t().safe_substitute(name="-test$n")}
+{TRY_SCM}
+(write
+  (try
+    (lambda ()
+      (if (null? (parse-ans-simple))
+          'parse-error-in-defn
+          (try
+            (lambda ()
+              (let ((vt (query-val-test$n)))
+                (if (eqv? 'parse-error vt)
+                    'parse-error-in-test/answer
+                    vt)))
+            'illegal-sexp-in-test/answer)))
+    'illegal-sexp-in-defn))
+(newline)
+"""
+    )
+
+
+##########
+
+
 SIMPLE_QUERY_T = Template(
     """
 $load_mk_vicare
@@ -173,24 +264,124 @@ $all_tests_query
 """
 )
 
-# All tests query has all non-empty test i/o, and definition text
-ALL_TEST_WRITE_T = Template(
-    f"""
+##### func makeAllTestsQueryString
+##### All tests query has all non-empty test i/o, and definition text
+@_lazy("ALL_TEST_WRITE_T")
+def _all_test_write_t() -> Template:
+    return Template(
+        f"""
 ;; allTests
 (define (ans-allTests)
   (define (results)
-    {ALLTESTS_STRING_1}
+    {constants.ALLTESTS_STRING_1}
     (== `( $definitionText ) defn-list)
 
     
-        {ALLTESTS_STRING_2}
+        {constants.ALLTESTS_STRING_2}
         (== `( $definitionText ) defns) (appendo defns `(((lambda x x) $all_test_inputs)) begin-body) (evalo `(begin . ,begin-body) (list $all_test_outputs) )))))
 (let ((results-fast {EVAL_STRING_FAST}))
   (if (null? results-fast)
     {EVAL_STRING_COMPLETE}
     results-fast)))
+
+(write (ans-allTests))
+(newline)
 """
-)
+    )
+
+
+##### Streaming allTests: asks for up to $n answers and prints each one as
+##### soon as it is found, so candidates can be shown while the search goes on.
+##### ARGS: $n $definitionText $all_test_inputs $all_test_outputs
+RUN_PRINT_SCM = """
+(define (print-answer c)
+  (write c)
+  (newline)
+  (flush-output-port (current-output-port)))
+
+(define take/print
+  (lambda (n f)
+    (cond
+      ((and n (zero? n)) '())
+      (else
+       (case-inf (f)
+         (() '())
+         ((f) (take/print n f))
+         ((c) (print-answer c) (cons c '()))
+         ((c f) (print-answer c) (cons c (take/print (and n (- n 1)) f))))))))
+
+(define-syntax run/print
+  (syntax-rules ()
+    ((_ n (q) g0 g ...)
+     (take/print n
+       (inc
+         ((fresh (q) g0 g ... state-deferred-resume
+            (lambdag@ (st)
+              (let ((st (state-with-scope st nonlocal-scope)))
+                (let ((z ((reify q) st)))
+                  (choice z empty-f)))))
+          (empty-state)))))))
+"""
+
+@_lazy("ALL_TEST_STREAM_T")
+def _all_test_stream_t() -> Template:
+    run_print = constants.ALLTESTS_STRING_1.replace(
+        "(run 1 (defns)", "(run/print $n (defns)", 1
+    )
+    return Template(
+        f"""
+;; allTests, streaming
+{RUN_PRINT_SCM}
+(define (ans-allTests)
+  (define (results)
+    {run_print}
+    (== `( $definitionText ) defn-list)
+
+        {constants.ALLTESTS_STRING_2}
+        (== `( $definitionText ) defns) (appendo defns `(((lambda x x) $all_test_inputs)) begin-body) (evalo `(begin . ,begin-body) (list $all_test_outputs) )))))
+(let ((results-fast {EVAL_STRING_FAST}))
+  (if (null? results-fast)
+    {EVAL_STRING_COMPLETE}
+    results-fast)))
+
+(when (null? (ans-allTests))
+  (print-answer '()))
+"""
+    )
+
+
+##### Search profiler: wraps a query so the instrumented interpreter counts its
+##### work and prints the counts as a #qbarliman-profile line (see
+##### templates/barliman-search-profile.scm).
+SEARCH_PROFILE_START_SCM = "\n(search-profile-start!)\n"
+SEARCH_PROFILE_FINISH_SCM = "\n(search-profile-finish!)\n"
+
+##########
+
+##### Single-mode allTests: one search mode only, so fast and complete searches
+##### can run as separate processes and race. Prints the list of answers.
+##### ARGS: $search_flags $definitionText $all_test_inputs $all_test_outputs
+@_lazy("ALL_TEST_SEARCH_T")
+def _all_test_search_t() -> Template:
+    return Template(
+        f"""
+;; allTests, single search mode
+(define (ans-allTests)
+  (define (results)
+    {constants.ALLTESTS_STRING_1}
+    (== `( $definitionText ) defn-list)
+
+        {constants.ALLTESTS_STRING_2}
+        (== `( $definitionText ) defns) (appendo defns `(((lambda x x) $all_test_inputs)) begin-body) (evalo `(begin . ,begin-body) (list $all_test_outputs) )))))
+  (begin $search_flags (results)))
+
+(write (ans-allTests))
+(newline)
+"""
+    )
+
+
+##########
 
 EVAL_QUERY_T = Template(
     """
@@ -253,3 +444,49 @@ def unroll(tmpl: Template, subs: dict, iters: int = 5, res: str = "") -> str:
             print()
 
     return curr if curr == res else unroll(Template(curr), subs, iters - 1, curr)
+
+
+class QueryTemplate:
+    """A template unrolled once, ahead of time, around its parameters.
+
+    The fixed substitutions are applied until nothing changes, as unroll
+    does, and the result is split at the remaining parameter placeholders.
+    render() then only joins strings, so building a query costs the size of
+    the parameters, and parameter text is never scanned for placeholders.
+    """
+
+    def __init__(
+        self, tmpl: Template, params: Iterable[str], fixed: Optional[dict] = None
+    ):
+        self.params = frozenset(params)
+        text = tmpl.template
+        for _ in range(5):
+            unrolled = Template(text).safe_substitute(**(fixed or {}))
+            if unrolled == text:
+                break
+            text = unrolled
+        else:
+            raise ValueError("Max template unrolling iterations exceeded")
+
+        self._literals: List[str] = []  # text around the placeholders
+        self._names: List[str] = []  # parameter at the end of each literal
+        pos = 0
+        for match in Template.pattern.finditer(text):
+            name = match.group("named") or match.group("braced")
+            if name in self.params:
+                self._literals.append(text[pos : match.start()])
+                self._names.append(name)
+                pos = match.end()
+        self._literals.append(text[pos:])
+
+    @property
+    def prefix(self) -> str:
+        """The fixed text before the first parameter."""
+        return self._literals[0]
+
+    def render(self, subs: dict) -> str:
+        pieces = [self._literals[0]]
+        for name, literal in zip(self._names, self._literals[1:]):
+            pieces.append(str(subs[name]))
+            pieces.append(literal)
+        return "".join(pieces)
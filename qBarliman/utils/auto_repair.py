@@ -0,0 +1,124 @@
+"""
+Auto-repair: variants of a definition with subexpressions punched out as
+holes, for synthesis to fill back in so that every test passes.
+"""
+
+import itertools
+import string
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+from qBarliman.utils.sexp import ATOM, LIST, PREFIX, Datum, read_all
+
+# Special form keywords, which a hole would only turn into an application
+_KEYWORDS = frozenset(
+    {
+        "and",
+        "begin",
+        "cond",
+        "define",
+        "else",
+        "if",
+        "lambda",
+        "let",
+        "let*",
+        "letrec",
+        "match",
+        "or",
+        "quasiquote",
+        "quote",
+    }
+)
+
+
+@dataclass(frozen=True)
+class RepairVariant:
+    definition_text: str
+    holes: Tuple[str, ...]  # text of each subexpression replaced
+    spans: Tuple[Tuple[int, int], ...]  # where they were in the original text
+    size: int  # atoms replaced, over all holes
+
+    @property
+    def label(self) -> str:
+        """Unique among the variants of one definition."""
+        return ",".join(f"{start}-{end}" for start, end in self.spans)
+
+
+def _size(datum: Datum) -> int:
+    if datum.kind == ATOM:
+        return 1
+    return sum(map(_size, datum.children)) or 1  # () counts as an atom
+
+
+def _subexpressions(datum: Datum) -> Iterator[Datum]:
+    """Datums under datum that may be replaced by a hole."""
+    children = datum.children
+    for i, child in enumerate(children):
+        if child.kind == PREFIX and child.text == ",":
+            continue  # Already a hole
+        if datum.kind == LIST and child.kind == ATOM:
+            if i == 0 and child.text in _KEYWORDS:
+                continue
+            # The tests call the defined name, so it must stay
+            if i == 1 and children[0].kind == ATOM and children[0].text == "define":
+                continue
+        yield child
+        yield from _subexpressions(child)
+
+
+def _hole_names(data: List[Datum]) -> Iterator[str]:
+    """Logic variable names the definition does not already use as holes."""
+
+    def used(datum: Datum) -> Iterator[str]:
+        if datum.kind == PREFIX and datum.text == ",":
+            if datum.children[0].kind == ATOM:
+                yield datum.children[0].text
+        for child in datum.children:
+            yield from used(child)
+
+    taken = {name for datum in data for name in used(datum)}
+    return (name for name in string.ascii_uppercase if name not in taken)
+
+
+def _overlap(a: Datum, b: Datum) -> bool:
+    return a.start < b.end and b.start < a.end
+
+
+def hole_variants(
+    definition_text: str, pairs: bool = False, limit: int = 0
+) -> List[RepairVariant]:
+    """Variants of definition_text with one hole, and optionally two, smallest first.
+
+    Each hole is a subexpression replaced by a fresh ,X logic variable of the
+    query templates. limit keeps only the first limit variants, 0 keeps all.
+    Raises SexpSyntaxError if the definition is malformed.
+    """
+    data = read_all(definition_text)
+    candidates = [sub for datum in data for sub in _subexpressions(datum)]
+    names = list(_hole_names(data))
+    choices = [(c,) for c in candidates] if names else []
+    if pairs and len(names) >= 2:
+        choices += [
+            (a, b)
+            for a, b in itertools.combinations(candidates, 2)
+            if not _overlap(a, b)
+        ]
+    choices.sort(key=lambda h: (sum(map(_size, h)), len(h), h[0].start))
+    if limit > 0:
+        choices = choices[:limit]
+
+    variants = []
+    for holes in choices:
+        text = definition_text
+        # Splice from the end so earlier spans stay valid
+        for hole, name in sorted(zip(holes, names), key=lambda h: -h[0].start):
+            text = f"{text[: hole.start]},{name}{text[hole.end :]}"
+        variants.append(
+            RepairVariant(
+                text,
+                tuple(definition_text[h.start : h.end] for h in holes),
+                tuple((h.start, h.end) for h in holes),
+                sum(map(_size, holes)),
+            )
+        )
+    return variants
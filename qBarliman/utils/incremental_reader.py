@@ -0,0 +1,184 @@
+"""
+An incremental reader for text that is being edited, so syntax errors are
+found as the user types rather than by a Scheme process.
+
+Besides reading, it checks what Chez would reject once the text is spliced
+into a query: illegal # tokens, misplaced dots, and unquotes that no
+quasiquote encloses. Definitions and test inputs are spliced inside the
+query's quasiquote, so their holes (,A) are legal; expected outputs are not.
+"""
+
+import bisect
+import re
+from typing import List, Optional, Tuple
+
+from qBarliman.utils.sexp import (
+    ATOM,
+    LIST,
+    PREFIX,
+    Datum,
+    SexpSyntaxError,
+    _Reader,
+    datum_to_string,
+)
+
+# Characters, booleans, numbers with a radix or exactness prefix, #!eof ...
+_HASH_ATOM_RE = re.compile(
+    r"#(?:\\.+|[tf]|true|false|![a-z-]+|[xbodei]\S+)", re.IGNORECASE | re.DOTALL
+)
+
+# Change in quasiquote depth under each quasiquote or unquote form
+_QUASI_SHIFT = {
+    "`": 1,
+    "quasiquote": 1,
+    ",": -1,
+    ",@": -1,
+    "unquote": -1,
+    "unquote-splicing": -1,
+}
+
+
+def check_datum(datum: Datum, quasi_depth: Optional[int]) -> None:
+    """Raise SexpSyntaxError for what the reader accepts but Chez does not.
+
+    quasi_depth is the number of quasiquotes around datum, less the unquotes,
+    or None inside a quote outside any quasiquote, where unquotes are data.
+    """
+    if datum.kind == ATOM:
+        if datum.text == ".":
+            raise SexpSyntaxError("Misplaced '.'", datum.start)
+        if datum.text.startswith("#") and not _HASH_ATOM_RE.fullmatch(datum.text):
+            raise SexpSyntaxError(f"Illegal token {datum.text!r}", datum.start)
+        return
+
+    children = datum.children
+    form = None
+    if datum.kind == PREFIX:
+        form = datum.text
+    elif datum.kind == LIST and len(children) == 2 and children[0].kind == ATOM:
+        form = children[0].text
+    inner = quasi_depth
+    if quasi_depth == 0 and form in ("'", "quote"):
+        inner = None
+    elif quasi_depth is not None:
+        inner = quasi_depth + _QUASI_SHIFT.get(form, 0)
+        if inner < 0:
+            raise SexpSyntaxError(f"{form!r} outside quasiquote", datum.start)
+
+    last = len(children) - 1
+    for i, child in enumerate(children):
+        if child.kind == ATOM and child.text == ".":
+            # (a . b): one dot, before the last element of a list
+            if datum.kind == LIST and 0 < i == last - 1:
+                continue
+            raise SexpSyntaxError("Misplaced '.'", child.start)
+        # The keyword of a quote form is outside it
+        check_datum(child, quasi_depth if datum.kind == LIST and i == 0 else inner)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    lo, hi = 0, n  # a[:lo] == b[:lo] and a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    """Length of the common suffix of a and b, at most limit."""
+    return _common_prefix(a[::-1][:limit], b[::-1][:limit])
+
+
+class IncrementalReader:
+    """Reads a text each time it changes, rereading only the top-level datums
+    an edit touched.
+
+    Top-level datums that end before the edit are kept. Reading resumes
+    after them and stops as soon as it reaches, past the edit, a datum that
+    started at the same place in the old text; the rest is shifted over.
+    Typing into one definition of a long buffer rereads that definition.
+
+    The edit can be given, as from QTextDocument.contentsChange; otherwise it
+    is found by comparing the old and new text.
+    """
+
+    def __init__(self, quasi_depth: int = 1):
+        self.quasi_depth = quasi_depth  # quasiquotes the text is spliced into
+        self.text = ""
+        self.error: Optional[SexpSyntaxError] = None
+        self.code_changed = False  # whether the last update changed the canonical form
+        # (start, end, canonical text) of each top-level datum read
+        self._data: List[Tuple[int, int, str]] = []
+
+    @property
+    def canonical(self) -> str:
+        """As sexp.canonical_form: malformed text is its own canonical form."""
+        if self.error:
+            return self.text
+        return " ".join(canonical for _, _, canonical in self._data)
+
+    def update(
+        self, text: str, edit: Optional[Tuple[int, int, int]] = None
+    ) -> Optional[SexpSyntaxError]:
+        """Read text, the new version of the text; returns its first error.
+
+        edit is (position, characters removed, characters added), if known.
+        """
+        old, old_data = self.text, self._data
+        shift = len(text) - len(old)
+        if edit and edit[2] - edit[1] == shift:
+            position, _, added = edit
+            prefix, suffix = position, len(text) - position - added
+        elif text == old:
+            self.code_changed = False
+            return self.error
+        else:
+            prefix = _common_prefix(old, text)
+            suffix = _common_suffix(old, text, min(len(old), len(text)) - prefix)
+
+        # A datum is kept if the character after it is unchanged too
+        kept = bisect.bisect_left(old_data, prefix, key=lambda d: d[1])
+        data = old_data[:kept]
+        reusable = {}
+        if not self.error:  # An error's message may quote old positions
+            first = bisect.bisect_left(old_data, len(old) - suffix, key=lambda d: d[0])
+            reusable = {old_data[i][0] + shift: i for i in range(first, len(old_data))}
+
+        reader = _Reader(text, data[-1][1] if data else 0)
+        error = None
+        reused = len(old_data)  # first old datum shifted over
+        try:
+            while (token := reader.peek()) is not None:
+                if (i := reusable.get(token.start)) is not None:
+                    reused = i
+                    data += [(s + shift, e + shift, c) for s, e, c in old_data[i:]]
+                    break
+                if (datum := reader.read()) is None:
+                    break
+                check_datum(datum, self.quasi_depth)
+                data.append((datum.start, datum.end, datum_to_string(datum)))
+        except SexpSyntaxError as e:
+            error = e
+
+        if error or self.error:
+            self.code_changed = True  # Malformed text is its own canonical form
+        else:
+            reread = data[kept : len(data) - (len(old_data) - reused)]
+            replaced = old_data[kept:reused]
+            self.code_changed = [c for _, _, c in reread] != [c for _, _, c in replaced]
+        self.text, self._data, self.error = text, data, error
+        return error
+
+    def describe_error(self) -> str:
+        """The error with its line and column, or "" if the text is well formed."""
+        if not self.error:
+            return ""
+        line = self.text.count("\n", 0, self.error.position) + 1
+        column = self.error.position - self.text.rfind("\n", 0, self.error.position)
+        return f"{self.error.message} at line {line}, column {column}"
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QProcess, QTimer, Signal
+
+from qBarliman.constants import CORE_FULLPATH, TMP_DIR, ensure_tmp_dir, scheme_executable
+from qBarliman.utils import log as l
+
+COMPILE_TIMEOUT_S = 300
+
+
+def scheme_string(text: str) -> str:
+    """Quote text as a Scheme string literal."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def interpreter_hash(paths: List[str] = CORE_FULLPATH) -> str:
+    """Content hash of the interpreter sources and the Scheme executable."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    # Compiled objects are only valid for the Chez build that produced them
+    if exe := shutil.which(scheme_executable() or ""):
+        digest.update(f"{exe}:{os.stat(exe).st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _so_path(paths: List[str]) -> Optional[str]:
+    """Where the compiled paths are cached, or None if they cannot be."""
+    if not scheme_executable():
+        return None
+    ensure_tmp_dir()
+    try:
+        digest = interpreter_hash(paths)
+    except OSError as e:
+        l.warn(f"Could not hash interpreter sources: {e}")
+        return None
+    return os.path.join(TMP_DIR, f"{_prefix(paths)}{digest}.so")
+
+
+def _prefix(paths: List[str]) -> str:
+    # Named after the files loaded on top of miniKanren, so variants and the
+    # profiled interpreter can be cached side by side
+    names = [os.path.basename(path) for path in paths if path not in CORE_FULLPATH[:-1]]
+    return "".join(f"{os.path.splitext(name)[0]}-" for name in names)
+
+
+def _remove_stale(prefix: str, keep: str):
+    pattern = re.compile(re.escape(prefix) + r"[0-9a-f]{16}\.so")
+    for name in os.listdir(TMP_DIR):
+        path = os.path.join(TMP_DIR, name)
+        if pattern.fullmatch(name) and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class InterpreterBuild(QObject):
+    """Compiles the concatenated interpreter sources in a background Scheme process.
+
+    The compiled object is written under a temporary name and renamed into
+    place, so a build that is killed or fails never leaves a partial .so.
+    """
+
+    finished = Signal(str)  # path of the compiled interpreter, "" if it failed
+
+    def __init__(self, paths: List[str], parent=None):
+        super().__init__(parent)
+        self.paths = list(paths)
+        self.so_path: Optional[str] = None  # set once compiled
+        self.done = False
+        self._target = _so_path(self.paths)
+        self._process: Optional[QProcess] = None
+        self._src_path = ""
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+
+    @property
+    def _tmp_so_path(self) -> str:
+        return f"{self._src_path[:-3]}.so"
+
+    def start(self):
+        if self.done or self._process is not None:
+            return
+        if self._target is None or os.path.exists(self._target):
+            self._finish(self._target)
+            return
+        try:
+            fd, self._src_path = tempfile.mkstemp(suffix=".ss", dir=TMP_DIR)
+            with os.fdopen(fd, "w", encoding="utf-8") as src:
+                for path in self.paths:
+                    with open(path, "r", encoding="utf-8") as f:
+                        src.write(f.read() + "\n")
+        except OSError as e:
+            l.warn(f"Compiling interpreter failed: {e}")
+            self._finish(None)
+            return
+
+        l.good(f"Compiling interpreter to {self._target}")
+        self._process = QProcess(self)
+        self._process.finished.connect(self._on_finished)
+        self._process.errorOccurred.connect(self._on_error)
+        self._timer.timeout.connect(self._process.kill)
+        self._timer.start(COMPILE_TIMEOUT_S * 1000)
+        self._process.start(scheme_executable(), ["-q"])
+        src, so = scheme_string(self._src_path), scheme_string(self._tmp_so_path)
+        self._process.write(f"(compile-file {src} {so})\n".encode("utf-8"))
+        self._process.closeWriteChannel()
+
+    def wait(self) -> Optional[str]:
+        """Block until the build is done, for callers that cannot wait for finished."""
+        self.start()
+        if self._process is not None and not self.done:
+            if not self._process.waitForFinished(COMPILE_TIMEOUT_S * 1000):
+                self._process.kill()
+                self._process.waitForFinished(1000)
+        return self.so_path
+
+    def _on_finished(self, exit_code: int, exit_status: QProcess.ExitStatus):
+        ok = exit_status == QProcess.NormalExit and exit_code == 0
+        if ok and os.path.exists(self._tmp_so_path):
+            try:
+                os.replace(self._tmp_so_path, self._target)
+                _remove_stale(_prefix(self.paths), self._target)
+                self._finish(self._target)
+                return
+            except OSError as e:
+                l.warn(f"Compiling interpreter failed: {e}")
+        else:
+            stderr = self._process.readAllStandardError().data()
+            stderr = stderr.decode("utf-8", "replace")
+            l.warn(f"Compiling interpreter failed: {stderr.strip()}")
+        self._finish(None)
+
+    def _on_error(self, error: QProcess.ProcessError):
+        # A process that never started will not emit finished
+        if error == QProcess.ProcessError.FailedToStart:
+            l.warn(f"Compiling interpreter failed: {error}")
+            self._finish(None)
+
+    def _finish(self, so_path: Optional[str]):
+        if self.done:
+            return
+        self._timer.stop()
+        if self._src_path:
+            for path in (self._src_path, self._tmp_so_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.so_path, self.done = so_path, True
+        if so_path:
+            l.debug(f"Using compiled interpreter {so_path}")
+        self.finished.emit(so_path or "")
+
+
+_builds: Dict[Tuple[str, ...], InterpreterBuild] = {}
+
+
+def interpreter_build(paths: List[str] = CORE_FULLPATH) -> InterpreterBuild:
+    """The shared build of paths, started on first use; it does not block."""
+    key = tuple(paths)
+    if (build := _builds.get(key)) is None:
+        build = _builds[key] = InterpreterBuild(paths)
+        build.start()
+    return build
+
+
+def load_prelude(paths: List[str]) -> str:
+    """Query prelude that loads each of paths."""
+    return "".join(f"\n(load {scheme_string(path)})" for path in paths)
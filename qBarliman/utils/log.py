@@ -1,3 +1,16 @@
+"""
+Level-gated console logging.
+
+A message is printed only if VERBOSE is at least its level, and nothing is
+formatted otherwise. Pass expensive values as arguments rather than
+formatting them into the message: %-style arguments are interpolated, and
+callables (the message or an argument) are called, only for printed
+messages.
+
+    l.debug("Final stdout: %s", stdout)
+    l.scheme("Query:\\n%s", lambda: rainbowp(query))
+"""
+
 import sys
 
 VERBOSE = 3
@@ -10,26 +23,36 @@ SCHEME = "🖨️"  # 4
 USE_COLORS = sys.stdout.isatty()
 
 
-def warn(*args) -> None:
-    if VERBOSE >= 0:
-        print(f"\033[33m{WARN}\033[0m" if USE_COLORS else WARN, *args)
+def enabled(level: int) -> bool:
+    """True if messages of level are printed; for guarding costly logging."""
+    return VERBOSE >= level
+
+
+def _emit(level: int, prefix: str, color: int, message, args: tuple) -> None:
+    if VERBOSE < level:
+        return
+    if callable(message):
+        message = message()
+    if args:
+        message = message % tuple(a() if callable(a) else a for a in args)
+    print(f"\033[{color}m{prefix}\033[0m" if USE_COLORS else prefix, message)
+
+
+def warn(message="", *args) -> None:
+    _emit(0, WARN, 33, message, args)
 
 
-def good(*args) -> None:
-    if VERBOSE >= 1:
-        print(f"\033[32m{GOOD}\033[0m" if USE_COLORS else GOOD, *args)
+def good(message="", *args) -> None:
+    _emit(1, GOOD, 32, message, args)
 
 
-def info(*args) -> None:
-    if VERBOSE >= 2:
-        print(f"\033[37m{INFO}\033[0m" if USE_COLORS else INFO, *args)
+def info(message="", *args) -> None:
+    _emit(2, INFO, 37, message, args)
 
 
-def debug(*args) -> None:
-    if VERBOSE >= 3:
-        print(f"\033[36m{DEBUG}\033[0m" if USE_COLORS else DEBUG, *args)
+def debug(message="", *args) -> None:
+    _emit(3, DEBUG, 36, message, args)
 
 
-def scheme(*args) -> None:
-    if VERBOSE >= 4:
-        print(f"\033[34m{SCHEME}\033[0m" if USE_COLORS else SCHEME, *args)
+def scheme(message="", *args) -> None:
+    _emit(4, SCHEME, 34, message, args)
@@ -1,29 +1,54 @@
 from enum import Enum, auto
-from typing import Any, Dict, Optional, Protocol
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol
 
 from PySide6.QtCore import QObject, Signal
 
-from qBarliman.constants import LOAD_MK_SCM, LOAD_MK_VICARE_SCM
+from qBarliman.constants import (
+    BARLIMAN_SEARCH_PROFILE_FULLPATH,
+    CORE_FULLPATH,
+    EVAL_FLAGS_COMPLETE,
+    EVAL_FLAGS_FAST,
+    INTERP_VARIANTS,
+    PROFILED_FULLPATH,
+    SEARCH_PROFILE,
+    SEARCH_STRATEGY,
+)
+from qBarliman import templates
 from qBarliman.models.scheme_document_data import SchemeDocumentData
 from qBarliman.templates import (
-    ALL_TEST_WRITE_T,
-    MAKE_NEW_TEST_N_QUERY_STRING_T,
-    MAKE_QUERY_SIMPLE_FOR_MONDO_SCHEME_T,
-    MAKE_QUERY_STRING_T,
+    MAKE_QUERY_SIMPLE_T,
     PARSE_ANS_STRING_T,
-    unroll,
+    SEARCH_PROFILE_FINISH_SCM,
+    SEARCH_PROFILE_START_SCM,
+    QueryTemplate,
 )
 from qBarliman.utils import log as l
+from qBarliman.utils.interpreter_cache import (
+    interpreter_build,
+    load_prelude,
+    scheme_string,
+)
 from qBarliman.utils.load_interpreter import (
     load_interpreter_code,
 )
 from qBarliman.utils.rainbowp import rainbowp
+from qBarliman.utils.tracing import tracer
 
 
 class SchemeQueryType(Enum):
     SIMPLE = auto()
     TEST = auto()
     ALL_TESTS = auto()
+    ALL_TESTS_STREAM = auto()
+    ALL_TESTS_FAST = auto()
+    ALL_TESTS_COMPLETE = auto()
+
+
+class SearchStrategy(Enum):
+    """How the allTests query combines the fast and complete searches."""
+
+    SEQUENTIAL = auto()  # one process, complete search only if fast finds nothing
+    RACE = auto()  # fast and complete searches in separate processes, in parallel
 
 
 class QueryStrategy(Protocol):
@@ -40,105 +65,257 @@ class BaseQueryStrategy:  # Abstract base class for common setup
 
 
 class SimpleQueryStrategy(BaseQueryStrategy, QueryStrategy):
+    def __init__(self, interpreter_code: str):
+        super().__init__(interpreter_code)
+        self.template = QueryTemplate(
+            MAKE_QUERY_SIMPLE_T,
+            params=("defns",),
+            fixed={
+                "name": "-simple",
+                "body": ",_",
+                "expectedOut": "q",
+                "eval_string_fast": PARSE_ANS_STRING_T.template,
+            },
+        )
+
     def build_query(self, document_data: SchemeDocumentData) -> str:
-        subs = {
-            "name": "-simple",
-            "defns": document_data.definition_text,
-            "body": ",_",
-            "expectedOut": "q",
-            "eval_string_fast": PARSE_ANS_STRING_T.template,
-        }
-        res = unroll(MAKE_QUERY_SIMPLE_FOR_MONDO_SCHEME_T, subs)
-        l.scheme(f"Simple query strategy:\n{rainbowp(res)}")
+        res = self.template.render({"defns": document_data.definition_text})
+        l.scheme("Simple query strategy:\n%s", lambda: rainbowp(res))
         return res
 
 
 class TestQueryStrategy(BaseQueryStrategy, QueryStrategy):
+    def __init__(self, interpreter_code: str):
+        super().__init__(interpreter_code)
+        self.template = QueryTemplate(
+            templates.MAKE_QUERY_TEST_T,
+            params=("n", "defns", "body", "expectedOut"),
+            fixed={"eval_string_fast": templates.EVAL_STRING_FAST_T.template},
+        )
+
     def build_query(self, data: tuple[SchemeDocumentData, int]) -> str:
         document_data, test_number = data
         subs = {
-            "name": f"-{test_number}",
-            "loadFileString": "loadFileString",
-            # Remove actualQueryFilePath dependency
             "n": test_number,
-            "new_test_query_template_string": MAKE_QUERY_STRING_T.template,
             "defns": document_data.definition_text,
-            "body": ",_",
-            "expectedOut": "q",
-            "eval_string_fast": PARSE_ANS_STRING_T.template,
+            "body": document_data.test_inputs[test_number - 1],
+            "expectedOut": document_data.test_expected[test_number - 1],
         }
-        res = unroll(MAKE_NEW_TEST_N_QUERY_STRING_T, subs)
-        l.scheme(f"Test query strategy:\n{rainbowp(res)}")
+        res = self.template.render(subs)
+        l.scheme("Test query strategy:\n%s", lambda: rainbowp(res))
         return res
 
 
+def _all_tests_subs(document_data: SchemeDocumentData) -> Dict[str, str]:
+    """Definitions and non-empty test pairs, as allTests template parameters."""
+    test_pairs = [
+        (i, o)
+        for i, o in zip(document_data.test_inputs, document_data.test_expected)
+        if i.strip() and o.strip()
+    ]
+    return {
+        "definitionText": document_data.definition_text,
+        "all_test_inputs": " ".join(i for i, _ in test_pairs),
+        "all_test_outputs": " ".join(o for _, o in test_pairs),
+    }
+
+
+_ALL_TESTS_PARAMS = ("definitionText", "all_test_inputs", "all_test_outputs")
+
+
 class AllTestsQueryStrategy(BaseQueryStrategy, QueryStrategy):
+    def __init__(self, interpreter_code: str):
+        super().__init__(interpreter_code)
+        self.template = QueryTemplate(templates.ALL_TEST_WRITE_T, _ALL_TESTS_PARAMS)
+
     def build_query(self, document_data: SchemeDocumentData) -> str:
-        # Filter out empty test cases and create pairs
-        test_pairs = [
-            (i, o)
-            for i, o in zip(document_data.test_inputs, document_data.test_expected)
-            if i.strip() and o.strip()
-        ]
+        subs = _all_tests_subs(document_data)
+        l.debug("all_test_inputs: %s", lambda: rainbowp(subs["all_test_inputs"]))
+        l.debug("all_test_outputs: %s", lambda: rainbowp(subs["all_test_outputs"]))
+        res = self.template.render(subs)
+        l.scheme("All tests query strategy:\n%s", lambda: rainbowp(res))
+        return res
 
-        for idx, (input_val, output_val) in enumerate(test_pairs):
-            l.debug(f"all_test_inputs #{idx}: {rainbowp(input_val)}")
-            l.debug(f"all_test_outputs #{idx}: {rainbowp(output_val)}")
 
-        all_test_inputs = [pair[0] for pair in test_pairs]
-        all_test_outputs = [pair[1] for pair in test_pairs]
+class AllTestsStreamQueryStrategy(BaseQueryStrategy, QueryStrategy):
+    """allTests asking for several answers, each printed as soon as it is found."""
 
-        subs = {
-            "load_mk_vicare": LOAD_MK_VICARE_SCM,
-            "load_mk": LOAD_MK_SCM,
-            "interp_scm": self.interpreter_code,
-            "query_simple": MAKE_QUERY_STRING_T.template,
-            "defns": document_data.definition_text,
-            "body": ",_",
-            "expectedOut": "q",
-            "eval_string_fast": PARSE_ANS_STRING_T.template,
-            "all_tests_query": ALL_TEST_WRITE_T.template,
-            "all_test_inputs": " ".join(all_test_inputs),
-            "all_test_outputs": " ".join(all_test_outputs),
-            "definitionText": document_data.definition_text,
-        }
+    def __init__(self, interpreter_code: str):
+        super().__init__(interpreter_code)
+        self.template = QueryTemplate(
+            templates.ALL_TEST_STREAM_T, ("n", *_ALL_TESTS_PARAMS)
+        )
 
-        res = unroll(ALL_TEST_WRITE_T, subs)
-        l.scheme(f"All tests query strategy:\n{rainbowp(res)}")
+    def build_query(self, data: tuple[SchemeDocumentData, int]) -> str:
+        document_data, answers = data
+        res = self.template.render({"n": answers, **_all_tests_subs(document_data)})
+        l.scheme("All tests streaming query strategy:\n%s", lambda: rainbowp(res))
         return res
 
 
+class AllTestsSearchQueryStrategy(BaseQueryStrategy, QueryStrategy):
+    """allTests running a single search mode, for racing the modes."""
+
+    def __init__(self, interpreter_code: str, search_flags: str):
+        super().__init__(interpreter_code)
+        self.search_flags = search_flags
+        self.template = QueryTemplate(
+            templates.ALL_TEST_SEARCH_T,
+            _ALL_TESTS_PARAMS,
+            {"search_flags": search_flags},
+        )
+
+    def build_query(self, document_data: SchemeDocumentData) -> str:
+        res = self.template.render(_all_tests_subs(document_data))
+        l.scheme(
+            "All tests %s query strategy:\n%s", self.search_flags, lambda: rainbowp(res)
+        )
+        return res
+
+
+_STRATEGIES: Dict[SchemeQueryType, Callable[[str], QueryStrategy]] = {
+    SchemeQueryType.SIMPLE: SimpleQueryStrategy,
+    SchemeQueryType.TEST: TestQueryStrategy,
+    SchemeQueryType.ALL_TESTS: AllTestsQueryStrategy,
+    SchemeQueryType.ALL_TESTS_STREAM: AllTestsStreamQueryStrategy,
+    SchemeQueryType.ALL_TESTS_FAST: lambda code: AllTestsSearchQueryStrategy(
+        code, EVAL_FLAGS_FAST
+    ),
+    SchemeQueryType.ALL_TESTS_COMPLETE: lambda code: AllTestsSearchQueryStrategy(
+        code, EVAL_FLAGS_COMPLETE
+    ),
+}
+
+
 class QueryBuilder(QObject):
     """Builds and executes Scheme queries using strategy pattern"""
 
     queryBuilt = Signal(str, SchemeQueryType)
 
-    def __init__(self, interpreter_code: Optional[str] = None):
+    def __init__(
+        self,
+        interpreter_code: Optional[str] = None,
+        prelude: Optional[str] = None,
+        search_strategy: SearchStrategy = SearchStrategy[SEARCH_STRATEGY.upper()],
+        search_profile: bool = SEARCH_PROFILE,
+    ):
         super().__init__()
-        # Load interpreter code here if not provided
-        self.interpreter_code = (
-            interpreter_code
-            if interpreter_code is not None
-            else load_interpreter_code()
-        )
+        self.search_strategy = search_strategy
+        self.search_profile = search_profile
+        # Loaded or compiled on first use, so a builder is cheap to create
+        self._interpreter_code = interpreter_code
+        self._prelude = prelude
+        self._compiled_preludes: Dict[str, str] = {}
+        self._strategies: Dict[SchemeQueryType, QueryStrategy] = {}
 
-        # Initialize strategies with injected or loaded interpreter code
-        self._strategies: Dict[SchemeQueryType, QueryStrategy] = {
-            SchemeQueryType.SIMPLE: SimpleQueryStrategy(self.interpreter_code),
-            SchemeQueryType.TEST: TestQueryStrategy(self.interpreter_code),
-            SchemeQueryType.ALL_TESTS: AllTestsQueryStrategy(self.interpreter_code),
-        }
+    @property
+    def interpreter_code(self) -> str:
+        if self._interpreter_code is None:
+            self._interpreter_code = load_interpreter_code()
+        return self._interpreter_code
 
-    def build_query(self, query_type: SchemeQueryType, data: Any) -> str:
-        l.debug(f"Building query of type {query_type}")
-        strategy = self._strategies.get(query_type)
-        if not strategy:
-            raise ValueError(f"Unknown query type: {query_type}")
+    @property
+    def prelude(self) -> str:
+        """Scheme code that loads miniKanren and the interpreter, preferring
+        the cached compiled object over inlining the sources. Profiled
+        queries load the instrumented interpreter."""
+        if self._prelude is not None:
+            return self._prelude
+        if self.search_profile:
+            return self._compiled_prelude("interp", PROFILED_FULLPATH)
+        return self._compiled_prelude("interp", CORE_FULLPATH, templates.QUERY_PRELUDE)
+
+    def _compiled_prelude(
+        self, key: str, paths: List[str], fallback: Optional[str] = None
+    ) -> str:
+        """Prelude loading the compiled paths, once built in the background.
+        Until then queries load fallback, by default the sources themselves."""
+        if key in self._compiled_preludes:
+            return self._compiled_preludes[key]
+        build = interpreter_build(paths)
+        if build.so_path:
+            prelude = load_prelude([build.so_path])
+        else:
+            prelude = fallback or load_prelude(paths)
+        if build.done:
+            self._compiled_preludes[key] = prelude
+        return prelude
 
-        query = strategy.build_query(data)
+    def _strategy(self, query_type: SchemeQueryType) -> QueryStrategy:
+        """The strategy for query_type, created with its template on first use."""
+        if query_type not in self._strategies:
+            if (factory := _STRATEGIES.get(query_type)) is None:
+                raise ValueError(f"Unknown query type: {query_type}")
+            self._strategies[query_type] = factory(self.interpreter_code)
+        return self._strategies[query_type]
+
+    def build_query(
+        self, query_type: SchemeQueryType, data: Any, with_prelude: bool = True
+    ) -> str:
+        """Build a query; with_prelude=False leaves out interpreter loading for warm workers."""
+        l.debug(f"Building query of type {query_type}")
+        with tracer.span("build_query", query_type=query_type.name) as span:
+            query = self._profiled(self._strategy(query_type).build_query(data))
+            if with_prelude:
+                query = self.prelude + query
+            span.args["query_chars"] = len(query)
         self.queryBuilt.emit(query, query_type)
         return query
 
+    def build_all_tests_queries(
+        self, data: SchemeDocumentData, with_prelude: bool = True
+    ) -> Dict[str, str]:
+        """The allTests query for the search strategy, by variant name.
+
+        SEQUENTIAL gives a single query; RACE gives a "fast" and a "complete"
+        query meant to run in parallel.
+        """
+        if self.search_strategy == SearchStrategy.RACE:
+            return {
+                "fast": self.build_query(
+                    SchemeQueryType.ALL_TESTS_FAST, data, with_prelude
+                ),
+                "complete": self.build_query(
+                    SchemeQueryType.ALL_TESTS_COMPLETE, data, with_prelude
+                ),
+            }
+        return {"": self.build_query(SchemeQueryType.ALL_TESTS, data, with_prelude)}
+
+    def variant_prelude(self, variant: str) -> str:
+        """Prelude that loads the INTERP_VARIANTS interpreter named variant."""
+        if variant == "interp":
+            return self.prelude
+        prelude = self._compiled_prelude(variant, INTERP_VARIANTS[variant])
+        if self.search_profile:
+            # Counts unifications and depth cuts, but no clauses. Loaded
+            # from source, as it uses the macros of the files before it
+            profiler = scheme_string(BARLIMAN_SEARCH_PROFILE_FULLPATH)
+            prelude += f"\n(load {profiler})"
+        return prelude
+
+    def build_portfolio_queries(
+        self, data: SchemeDocumentData, variants: Iterable[str], answers: int = 1
+    ) -> Dict[str, str]:
+        """The streaming allTests query under each interpreter variant, by name.
+
+        A search that finds nothing prints (), so only an answer wins a race.
+        """
+        query = self._strategy(SchemeQueryType.ALL_TESTS_STREAM).build_query(
+            (data, answers)
+        )
+        query = self._profiled(query)
+        queries = {}
+        for variant in variants:
+            queries[variant] = self.variant_prelude(variant) + "\n" + query
+            self.queryBuilt.emit(queries[variant], SchemeQueryType.ALL_TESTS_STREAM)
+        return queries
+
+    def _profiled(self, query: str) -> str:
+        """query, run under the search profiler if it is on."""
+        if not self.search_profile:
+            return query
+        return SEARCH_PROFILE_START_SCM + query + SEARCH_PROFILE_FINISH_SCM
+
     def _format_scheme_value(self, value: str) -> str:
         """Formats a Python string for use in Scheme code."""
         return f"{value}" if value.strip() else ""
@@ -1,3 +1,6 @@
+import re
+
+
 # There's probably a library or builtin for this but this is more fun.
 def esc(c, s) -> str:
     return f"\033[{c}m{s}\033[0m"
@@ -40,41 +43,42 @@ T_BRIGHT_WHITE = 97
 
 
 # Terminal version (ANSI escape codes):
+PCOLORS = [
+    (T_REVERSE, T_BRIGHT_WHITE),
+    T_GREEN,
+    T_YELLOW,
+    T_BLUE,
+    T_MAGENTA,
+    T_CYAN,
+    T_BRIGHT_GREEN,
+    T_BRIGHT_YELLOW,
+    T_BRIGHT_BLUE,
+    T_BRIGHT_MAGENTA,
+    T_BRIGHT_CYAN,
+]
+
+_SPECIAL = re.compile(r"[()\[\]{}$]")
+
+
 def rainbowp(text):
-    PCOLORS = [
-        (T_REVERSE, T_BRIGHT_WHITE),
-        T_GREEN,
-        T_YELLOW,
-        T_BLUE,
-        T_MAGENTA,
-        T_CYAN,
-        T_BRIGHT_GREEN,
-        T_BRIGHT_YELLOW,
-        T_BRIGHT_BLUE,
-        T_BRIGHT_MAGENTA,
-        T_BRIGHT_CYAN,
-    ]
-
-    color_index = 0
-    total_count = 0
-
-    output = ""
-    for char in text:
+    """Color brackets by nesting depth; unmatched closers and $ in red.
+
+    Only the special characters are visited, and the result is joined once,
+    so the cost is linear in the length of text.
+    """
+    depth = 0
+
+    def paint(match):
+        nonlocal depth
+        char = match.group()
         if char in "([{":
-            color = PCOLORS[color_index % len(PCOLORS)]
-            output += col(char, color)
-            color_index += 1
-            total_count += 1
-        elif char in ")]}":
-            if color_index > 0:
-                color_index -= 1
-                color = PCOLORS[color_index % len(PCOLORS)]
-                output += col(char, color)
-            else:
-                output += col(char, T_BRIGHT_RED)  # unmatched
-        elif char in "$":
-            output += col(char, T_BRIGHT_RED, T_REVERSE)
-        else:
-            output += char
-
-    return output
+            depth += 1
+            return col(char, PCOLORS[(depth - 1) % len(PCOLORS)])
+        if char == "$":
+            return col(char, T_BRIGHT_RED, T_REVERSE)
+        if depth == 0:
+            return col(char, T_BRIGHT_RED)  # unmatched
+        depth -= 1
+        return col(char, PCOLORS[depth % len(PCOLORS)])
+
+    return _SPECIAL.sub(paint, text)
@@ -0,0 +1,314 @@
+"""
+A small Scheme reader: enough of R6RS/Chez lexical syntax to find datum
+boundaries, skip comments and compare code by structure instead of text.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+)
+  | (?P<comment>;[^\n]*)
+  | (?P<block_comment>\#\|)
+  | (?P<datum_comment>\#;)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<unterminated_string>")
+  | (?P<char>\#\\.[^\s()\[\]";]*)
+  | (?P<open>\(|\[|\#\(|\#vu8\()
+  | (?P<close>\)|\])
+  | (?P<prefix>,@|,|'|`|\#'|\#`|\#,@|\#,)
+  | (?P<atom>[^\s()\[\]";'`,]+)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_CLOSER = {"(": ")", "[": "]", "#(": ")", "#vu8(": ")"}
+
+ATOM = "atom"
+LIST = "list"
+VECTOR = "vector"
+PREFIX = "prefix"
+
+
+class SexpSyntaxError(ValueError):
+    """Raised when text is not a well-formed sequence of s-expressions."""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} at position {position}")
+        self.message = message
+        self.position = position
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str  # a group name of _TOKEN_RE
+    text: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class Datum:
+    """A datum read from text, with its span in that text."""
+
+    kind: str  # ATOM, LIST, VECTOR or PREFIX
+    start: int
+    end: int
+    text: str = ""  # atom text, vector opener or prefix such as "'"
+    children: Tuple["Datum", ...] = ()
+
+
+def _skip_block_comment(text: str, pos: int) -> int:
+    """Return the position after the (possibly nested) block comment at pos."""
+    depth = 0
+    i = pos
+    while i < len(text):
+        if text.startswith("#|", i):
+            depth += 1
+            i += 2
+        elif text.startswith("|#", i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    raise SexpSyntaxError("Unterminated block comment", pos)
+
+
+def tokenize(text: str, pos: int = 0) -> Iterator[Token]:
+    """Yield the significant tokens of text from pos, skipping whitespace and
+    comments.
+
+    Datum comments are yielded as "datum_comment" tokens since skipping them
+    needs the reader.
+    """
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise SexpSyntaxError(f"Unexpected character {text[pos]!r}", pos)
+        kind = match.lastgroup
+        if kind == "block_comment":
+            pos = _skip_block_comment(text, pos)
+            continue
+        if kind == "unterminated_string":
+            raise SexpSyntaxError("Unterminated string", pos)
+        if kind not in ("space", "comment"):
+            yield Token(kind, match.group(), pos, match.end())
+        pos = match.end()
+
+
+class _Reader:
+    """Reads datums from text, tokenizing only as far as it has read."""
+
+    def __init__(self, text: str, pos: int = 0):
+        self.tokens = tokenize(text, pos)
+        self.peeked: Optional[Token] = None
+
+    def peek(self) -> Optional[Token]:
+        if self.peeked is None:
+            self.peeked = next(self.tokens, None)
+        return self.peeked
+
+    def next(self) -> Token:
+        token = self.peek()
+        self.peeked = None
+        return token
+
+    def read(self) -> Optional[Datum]:
+        """Read one datum, skipping datum comments; None at end of input."""
+        while (token := self.peek()) is not None:
+            if token.kind == "close":
+                raise SexpSyntaxError(f"Unexpected {token.text!r}", token.start)
+            self.next()
+            if token.kind == "datum_comment":
+                if self.read() is None:
+                    raise SexpSyntaxError("Datum comment without datum", token.start)
+                continue
+            if token.kind == "prefix":
+                child = self.read()
+                if child is None:
+                    raise SexpSyntaxError(f"{token.text!r} without datum", token.start)
+                return Datum(PREFIX, token.start, child.end, token.text, (child,))
+            if token.kind == "open":
+                return self.read_sequence(token)
+            return Datum(ATOM, token.start, token.end, token.text)
+        return None
+
+    def read_sequence(self, opener: Token) -> Datum:
+        closer = _CLOSER[opener.text]
+        children: List[Datum] = []
+        while (token := self.peek()) is not None:
+            if token.kind == "close":
+                self.next()
+                if token.text != closer:
+                    raise SexpSyntaxError(
+                        f"Expected {closer!r} to close {opener.text!r} at "
+                        f"position {opener.start}, found {token.text!r}",
+                        token.start,
+                    )
+                kind = LIST if opener.text in ("(", "[") else VECTOR
+                text = "" if kind == LIST else opener.text
+                return Datum(kind, opener.start, token.end, text, tuple(children))
+            if (datum := self.read()) is not None:
+                children.append(datum)
+        raise SexpSyntaxError(f"Unclosed {opener.text!r}", opener.start)
+
+
+def read_all(text: str) -> List[Datum]:
+    """Read every datum in text; raises SexpSyntaxError if it is malformed."""
+    reader = _Reader(text)
+    data = []
+    while (datum := reader.read()) is not None:
+        data.append(datum)
+    return data
+
+
+def datum_to_string(datum: Datum) -> str:
+    """Render a datum with single spaces and () for every list."""
+    if datum.kind == ATOM:
+        return datum.text
+    if datum.kind == PREFIX:
+        return datum.text + datum_to_string(datum.children[0])
+    opener = "(" if datum.kind == LIST else datum.text
+    return opener + " ".join(map(datum_to_string, datum.children)) + ")"
+
+
+def canonicalize(text: str) -> str:
+    """Canonical form of text: comments and layout removed, brackets unified."""
+    return " ".join(map(datum_to_string, read_all(text)))
+
+
+def canonical_form(text: str) -> str:
+    """Like canonicalize, but malformed text is its own canonical form, so any
+    edit to it still counts as a change."""
+    try:
+        return canonicalize(text)
+    except SexpSyntaxError:
+        return text
+
+
+class SexpFramer:
+    """Splits a stream of text into top-level datums as they complete.
+
+    Text is fed in arbitrary chunks.  Every character is scanned once, and a
+    datum spread over many chunks is kept as a list of pieces joined when it
+    completes, so framing a long stream costs time linear in its length.
+    Framing only tracks nesting, strings and comments: it finds datum
+    boundaries in well-formed output without validating it.
+    """
+
+    _DELIMITERS = frozenset(" \t\r\n\f()[]\";")
+
+    def __init__(self):
+        self._buffer = ""  # text being scanned, then what was left unscanned
+        self._pending: List[str] = []  # the datum's text from earlier feeds
+        self._start = None  # start of the datum being read, None between datums
+        self._depth = 0
+        self._state = None  # None, "string", "escape", "comment" or "block"
+        self._block_depth = 0
+        self._atom = False  # reading a top-level atom
+
+    def feed(self, text: str) -> List[str]:
+        """Add text and return the datums it completes, in order."""
+        buffer = self._buffer = self._buffer + text
+        datums = []
+        i = 0
+        while i < len(buffer):
+            c = buffer[i]
+            state = self._state
+            if state == "string":
+                if c == "\\":
+                    self._state = "escape"
+                elif c == '"':
+                    self._state = None
+                    if self._depth == 0:
+                        datums.append(self._end(i + 1))
+            elif state == "escape":
+                self._state = "string"
+            elif state == "comment":
+                if c == "\n":
+                    self._state = None
+            elif state == "block":
+                if buffer.startswith("|#", i):
+                    self._block_depth -= 1
+                    i += 1
+                    if self._block_depth == 0:
+                        self._state = None
+                elif buffer.startswith("#|", i):
+                    self._block_depth += 1
+                    i += 1
+                elif i + 1 == len(buffer):
+                    break  # May be the first half of |# or #|
+            elif self._atom and c in self._DELIMITERS:
+                self._atom = False
+                datums.append(self._end(i))
+                continue  # Scan the delimiter again as the start of what follows
+            elif self._atom:
+                pass
+            elif c in " \t\r\n\f":
+                pass
+            elif c == ";":
+                self._state = "comment"
+            elif c == "#" and "#vu8(".startswith(buffer[i : i + 5]):
+                if len(buffer) - i < 5:
+                    break  # Need more characters to know what this is
+                self._begin(i)
+                i += 3  # Continue at the opening parenthesis
+            elif buffer.startswith("#|", i):
+                self._state = "block"
+                self._block_depth = 1
+                i += 1
+            elif buffer.startswith("#\\", i):
+                if i + 2 >= len(buffer):
+                    break
+                self._begin(i)
+                if self._depth == 0:
+                    self._atom = True
+                i += 2  # The character itself may be a delimiter
+            elif c == '"':
+                self._begin(i)
+                self._state = "string"
+            elif c in "([":
+                self._begin(i)
+                self._depth += 1
+            elif c in ")]":
+                if self._depth > 0:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        datums.append(self._end(i + 1))
+            elif c in "'`,#@":
+                self._begin(i)  # Prefix, or the # of #( and #vu8(
+            else:
+                self._begin(i)
+                if self._depth == 0:
+                    self._atom = True
+            i += 1
+        if self._start is not None:
+            # Only the unscanned rest, a few characters at most, is kept
+            self._pending.append(buffer[self._start : i])
+            self._start = 0
+        self._buffer = buffer[i:]
+        return datums
+
+    def flush(self) -> List[str]:
+        """End of stream: return a trailing atom or incomplete datum, if any."""
+        if self._start is not None:
+            rest = "".join(self._pending) + self._buffer[self._start :]
+            rest = rest.strip()
+        else:  # Scanning may have stopped short at a lone "#"
+            rest = self._buffer.strip() if self._state is None else ""
+        self.__init__()
+        return [rest] if rest else []
+
+    def _begin(self, i: int):
+        if self._start is None:
+            self._start = i
+
+    def _end(self, i: int) -> str:
+        datum = "".join(self._pending) + self._buffer[self._start : i]
+        self._pending = []
+        self._start = None
+        return datum
@@ -0,0 +1,134 @@
+"""
+Span tracing for the query lifecycle: debounce, query building, launch,
+process start, first output and exit.
+
+Spans are kept in a bounded ring, so tracing is always on, and can be
+exported as Chrome trace-event JSON for chrome://tracing or Perfetto.
+Each track (a task type) becomes one row of the trace.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from qBarliman.constants import TRACE_MAX_SPANS
+from qBarliman.utils import log as l
+
+DEFAULT_TRACK = "main"
+
+
+@dataclass
+class Span:
+    name: str
+    track: str  # task type the span belongs to
+    start: float  # time.monotonic() seconds
+    end: float
+    args: Dict[str, Any] = field(default_factory=dict)  # task type, sizes, ...
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Tracer:
+    """Records the most recent max_spans spans."""
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.spans: deque = deque(maxlen=max_spans)
+        self._track = DEFAULT_TRACK
+
+    def add(
+        self,
+        name: str,
+        track: str,
+        start: float,
+        end: Optional[float] = None,
+        **args,
+    ) -> Span:
+        """Record a span that has already ended; end defaults to now."""
+        span = Span(name, track, start, time.monotonic() if end is None else end, args)
+        self.spans.append(span)
+        return span
+
+    def instant(self, name: str, track: str, **args) -> Span:
+        now = time.monotonic()
+        return self.add(name, track, now, now, **args)
+
+    @contextmanager
+    def span(self, name: str, track: Optional[str] = None, **args) -> Iterator[Span]:
+        """Time a block. Spans opened inside it without a track join this one's.
+
+        Sizes known only at the end can be added to the yielded span's args.
+        """
+        track = track or self._track
+        outer, self._track = self._track, track
+        span = Span(name, track, time.monotonic(), 0.0, args)
+        try:
+            yield span
+        finally:
+            self._track = outer
+            span.end = time.monotonic()
+            self.spans.append(span)
+
+    def since(self, track: str, start: float) -> List[Span]:
+        """track's spans that started at or after start, in order of starting."""
+        spans = [s for s in self.spans if s.track == track and s.start >= start]
+        return sorted(spans, key=lambda s: s.start)
+
+    def chrome_trace(self) -> dict:
+        """The recorded spans as a Chrome trace-event document."""
+        pid = os.getpid()
+        tids: Dict[str, int] = {}
+        events = []
+        for span in self.spans:
+            tid = tids.setdefault(span.track, len(tids) + 1)
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": "qBarliman",
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"task_type": span.track, **span.args},
+                }
+            )
+        for track, tid in tids.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": track},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        """Write chrome_trace() to path."""
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.chrome_trace(), f)
+            l.good(f"Wrote {len(self.spans)} trace spans to {path}")
+        except OSError as e:
+            l.warn(f"Could not write trace {path}: {e}")
+
+
+def breakdown(spans: List[Span]) -> str:
+    """One line per span: its name, variant if raced, and duration."""
+    lines = []
+    for span in spans:
+        name = span.name
+        if variant := span.args.get("variant"):
+            name = f"{name} ({variant})"
+        lines.append(f"{name}: {span.duration * 1000:.1f} ms")
+    return "\n".join(lines)
+
+
+tracer = Tracer()
@@ -2,7 +2,9 @@ from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (
     QGridLayout,
+    QHBoxLayout,
     QLabel,
+    QPushButton,
     QSplitter,
     QTextEdit,
     QVBoxLayout,
@@ -33,13 +35,11 @@ class EditorWindowUI(QWidget):
 
         # Declarative UI update map: signal_name -> (widget, update_function)
         self._widget_updaters = {
-            "definition_text": (
-                self.schemeDefinitionView,
-                lambda w, text: w.setPlainText(text),
-            ),
+            "definition_text": (self.schemeDefinitionView, self.set_definition_text),
             "best_guess": (self.bestGuessView, lambda w, text: w.setPlainText(text)),
             "definition_status": (self.definitionStatusLabel, self._set_labeled_text),
             "best_guess_status": (self.bestGuessStatusLabel, self._set_labeled_text),
+            "repair_status": (self.repairStatusLabel, self._set_labeled_text),
             "error_output": (self.errorOutputView, self._set_error_text),
             "test_cases": (
                 None,
@@ -49,6 +49,7 @@ class EditorWindowUI(QWidget):
                 None,
                 self._set_test_status,
             ),
+            "latency": (None, self._set_latency),
         }
 
         self.status_colors = {
@@ -59,6 +60,9 @@ class EditorWindowUI(QWidget):
             TaskStatus.THINKING: "purple",
             TaskStatus.FAILED: "red",
             TaskStatus.TERMINATED: "black",
+            TaskStatus.TIMEOUT: "brown",
+            TaskStatus.CPU_LIMIT: "brown",
+            TaskStatus.OOM: "brown",
         }
 
     def _buildUI(self):
@@ -91,6 +95,14 @@ class EditorWindowUI(QWidget):
         self.mainLayout.addWidget(self.definitionStatusLabel)
         self.mainLayout.addWidget(self.bestGuessStatusLabel)
 
+        # Synthesis with each subexpression of the definition punched out
+        self.autoRepairButton = QPushButton("Auto-repair", self)
+        self.repairStatusLabel = QLabel("", self)
+        self.repairLayout = QHBoxLayout()
+        self.repairLayout.addWidget(self.autoRepairButton)
+        self.repairLayout.addWidget(self.repairStatusLabel, 1)
+        self.mainLayout.addLayout(self.repairLayout)
+
         self.testInputs = []
         self.testExpectedOutputs = []
         self.testStatusLabels = []
@@ -206,6 +218,25 @@ class EditorWindowUI(QWidget):
         label.setText(text)
         label.setStyleSheet(f"color: {color};")
 
+    def _set_latency(self, data: tuple[str, str]):
+        """Show a task's latency breakdown, and search profile if any, as the
+        tooltip of its status label."""
+        task_type, text = data
+        if task_type == "simple":
+            label = self.definitionStatusLabel
+        elif task_type == "allTests":
+            label = self.bestGuessStatusLabel
+        elif task_type == "autoRepair":
+            label = self.repairStatusLabel
+        elif task_type.startswith("test"):
+            index = int(task_type[4:]) - 1
+            if not 0 <= index < len(self.testStatusLabels):
+                return
+            label = self.testStatusLabels[index]
+        else:
+            return
+        label.setToolTip(text)
+
     def reset_test_ui(self):
         """Resets the test UI elements to their default state."""
         for i in range(len(self.testInputs)):
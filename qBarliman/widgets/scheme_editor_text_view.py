@@ -1,12 +1,24 @@
 from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QKeyEvent, QUndoStack
+from PySide6.QtGui import QKeyEvent, QTextCursor, QUndoStack
 from PySide6.QtWidgets import QTextEdit
 
+from qBarliman.utils import log as l
+
+
+def _plain(selected_text: str) -> str:
+    """Selected text as toPlainText() would give it."""
+    return (
+        selected_text.replace("\u2029", "\n")
+        .replace("\u2028", "\n")
+        .replace("\u00a0", " ")
+    )
+
 
 class SchemeEditorTextView(QTextEdit):
     # List of logic variables to cycle through
     logic_vars = [f",{chr(c)}" for c in range(65, 91)]  # ,A ... ,Z
-    codeTextChanged = Signal(str)
+    codeTextChanged = Signal(str)  # whole text, when an edit could not be followed
+    codeEdited = Signal(int, int, str)  # position, characters removed, text inserted
 
     def __init__(self, parent=None):
         super().__init__(parent=parent)
@@ -20,6 +32,8 @@ class SchemeEditorTextView(QTextEdit):
         self.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth)
         self.setTabStopDistance(20)  # Equivalent to 4 spaces
         self._block_text_changed_signal = False  # Add flag to block signal emission
+        self._length = 0  # of the text as of the last edit reported
+        self.document().contentsChange.connect(self._on_contents_change)
 
     def keyPressEvent(self, event: QKeyEvent):
         # Disable listener while processing key event
@@ -37,10 +51,29 @@ class SchemeEditorTextView(QTextEdit):
         else:
             super().keyPressEvent(event)
 
-        # Re-enable listener and emit signal if not blocked
+        # Re-enable listener; the edit itself is reported by _on_contents_change
         self.setUpdatesEnabled(True)
-        if not self._block_text_changed_signal:
+
+    def _on_contents_change(self, position: int, removed: int, added: int):
+        """Reports an edit, however it was made, as codeEdited."""
+        length = self.document().characterCount() - 1  # Less the final separator
+        if self._block_text_changed_signal:
+            self._length = length
+            return
+        # An edit at the end may count the document's final separator as
+        # removed, added or both
+        removed = min(removed, self._length - position)
+        end = min(position + added, length)
+        if self._length - removed + end - position != length:
+            l.debug("Could not follow an edit, sending the whole text")
+            self._length = length
             self.codeTextChanged.emit(self.toPlainText())
+            return
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(position)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        self._length = length
+        self.codeEdited.emit(position, removed, _plain(cursor.selectedText()))
 
     def _insert_gensym(self, var_to_insert):
         cursor = self.textCursor()
@@ -86,4 +119,5 @@ class SchemeEditorTextView(QTextEdit):
             cursor = self.textCursor()  # Get the current cursor
             cursor.setPosition(old_cursor_pos)  # Restore old position
         self.setTextCursor(cursor)  # Apply the modified cursor
+        self._length = self.document().characterCount() - 1
         self._block_text_changed_signal = False  # Re-enable signal